@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning import DatabaseCleaning
+
+''' This script compares memory and throughput of the object-dtype path against the opt-in
+Arrow path on a synthetic orders_table, from the extracted DataFrame through cleaning to
+the serialised rows that get loaded into PostgreSQL. No database is needed: the object
+path is measured up to the row tuples to_sql inserts, the Arrow path up to the CSV buffer
+copy_to_db streams to COPY.
+
+Run it with: python benchmarks/arrow_pipeline_benchmark.py --rows 1000000 --repeats 3'''
+
+def make_orders_df(rows, seed=0):
+    '''
+    This function builds an object-dtype DataFrame shaped like the orders_table read from the RDS.
+
+    Args:
+        rows (int): The number of rows to generate.
+        seed (int): The seed for the random number generator.
+
+    Returns:
+        pandas.DataFrame: The synthetic orders DataFrame.
+    '''
+    rng = np.random.default_rng(seed)
+    uuids = [str(uuid.uuid4()) for _ in range(rows)]
+    store_codes = np.array([f"GB-{code:08X}" for code in range(500)], dtype=object)
+    product_codes = np.array([f"a{code}-{code * 7919 % 10000000:07d}" for code in range(1000)], dtype=object)
+
+    return pd.DataFrame({
+        "level_0": np.arange(rows),
+        "index": np.arange(rows),
+        "date_uuid": uuids,
+        "first_name": None,
+        "last_name": None,
+        "user_uuid": uuids[::-1],
+        "card_number": rng.integers(10**15, 10**16, rows),
+        "store_code": store_codes[rng.integers(0, len(store_codes), rows)],
+        "product_code": product_codes[rng.integers(0, len(product_codes), rows)],
+        "1": None,
+        "product_quantity": rng.integers(1, 20, rows),
+    })
+
+def object_path(extracted_df):
+    '''
+    This function cleans the object-dtype DataFrame and builds the row tuples to_sql would insert.
+    '''
+    cleaned_df = DatabaseCleaning().clean_orders_data(extracted_df)
+
+    # to_sql turns every row into a tuple of Python objects before inserting it
+    rows = list(cleaned_df.itertuples(index=False, name=None))
+    return cleaned_df, len(rows)
+
+def arrow_path(extracted_df):
+    '''
+    This function cleans the Arrow-backed DataFrame and writes the CSV buffer copy_to_db would COPY.
+    '''
+    cleaned_df = DatabaseCleaning(use_arrow=True).clean_orders_data(extracted_df)
+    csv_buffer = pa.BufferOutputStream()
+    pa_csv.write_csv(pa.Table.from_pandas(cleaned_df, preserve_index=False), csv_buffer, write_options=pa_csv.WriteOptions(include_header=False))
+    return cleaned_df, csv_buffer.getvalue().size
+
+def best_time(path, extracted_df, repeats):
+    '''
+    This function runs one pipeline path a number of times and returns the fastest run time in seconds.
+
+    The first run is a warm-up, so imports and caches are not counted.
+    '''
+    path(extracted_df)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        path(extracted_df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def python_heap_peak(path, extracted_df):
+    '''
+    This function runs one pipeline path under tracemalloc, which slows it down, and returns the Python heap peak in bytes.
+    '''
+    tracemalloc.start()
+    cleaned_df, _ = path(extracted_df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cleaned_df, peak
+
+def measure(name, path, extracted_df, repeats):
+    '''
+    This function prints the best run time, DataFrame memory and Python heap peak of one pipeline path.
+
+    The time comes from warm runs without tracemalloc, the heap peak from a separate traced run.
+
+    Args:
+        name (str): The label of the path in the output.
+        path (function): Either object_path or arrow_path.
+        extracted_df (pandas.DataFrame): The DataFrame the path starts from.
+        repeats (int): The number of timed runs to take the best of.
+    '''
+    elapsed = best_time(path, extracted_df, repeats)
+    cleaned_df, heap_peak = python_heap_peak(path, extracted_df)
+
+    extracted_mb = extracted_df.memory_usage(deep=True).sum() / 2**20
+    cleaned_mb = cleaned_df.memory_usage(deep=True).sum() / 2**20
+    rows_per_second = len(extracted_df) / elapsed
+    print(f"{name:<8} {elapsed:>9.2f} {rows_per_second:>14,.0f} {extracted_mb:>13.1f} {cleaned_mb:>11.1f} {heap_peak / 2**20:>15.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the object-dtype and Arrow pipeline paths.")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    object_df = make_orders_df(args.rows)
+    arrow_df = object_df.convert_dtypes(dtype_backend="pyarrow")
+
+    print(f"{args.rows:,} rows")
+    print(f"{'path':<8} {'seconds':>9} {'rows/second':>14} {'extracted MB':>13} {'cleaned MB':>11} {'Python heap MB':>15}")
+    measure("object", object_path, object_df, args.repeats)
+    measure("arrow", arrow_path, arrow_df, args.repeats)
@@ -0,0 +1,66 @@
+import argparse
+import os
+import subprocess
+import sys
+
+''' This script tracks the startup import cost of each entry point using python -X importtime.
+Each entry point is imported in a fresh interpreter, together with the modules its stage
+imports lazily, and the self time of every imported module is added up. Run it with:
+
+    python benchmarks/import_time_benchmark.py --top 5
+
+Entry points whose dependencies are not installed are reported as failed.'''
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the code each entry point runs at startup, including the lazy imports of its stage
+ENTRY_POINTS = {
+    "main.py --list": "import main",
+    "schema / queries stage": "import main, psycopg2",
+    "queries stage with piechart": "import main, psycopg2, numpy, matplotlib.pyplot",
+    "rds table stage": "import main, data_extraction, data_cleaning, sqlalchemy",
+    "api table stage": "import main, data_extraction, data_cleaning, sqlalchemy, aiohttp",
+    "s3 table stage": "import main, data_extraction, data_cleaning, sqlalchemy, boto3",
+    "pdf table stage": "import main, data_extraction, data_cleaning, sqlalchemy, aiohttp, tabula",
+}
+
+def measure_import_time(code):
+    '''
+    This function runs code in a fresh interpreter with -X importtime and parses the report.
+
+    Args:
+        code (str): The Python code to run, e.g. "import main".
+
+    Returns:
+        list: A list of (self time in microseconds, module name) tuples, one per imported module.
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    module_times = []
+    for line in result.stderr.splitlines():
+        # lines look like "import time:       389 |      15115 |     yaml"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, module_name = line[len("import time:"):].split("|")
+        module_times.append((int(self_us), module_name.strip()))
+
+    return module_times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the startup import cost of each entry point.")
+    parser.add_argument("--top", type=int, default=3, help="number of most expensive modules to list per entry point")
+    args = parser.parse_args()
+
+    for entry_point, code in ENTRY_POINTS.items():
+        try:
+            module_times = measure_import_time(code)
+        except RuntimeError as e:
+            print(f"{entry_point:<28} failed: {e}")
+            continue
+
+        total_ms = sum(self_us for self_us, _ in module_times) / 1000
+        heaviest = sorted(module_times, reverse=True)[:args.top]
+        print(f"{entry_point:<28} {total_ms:>9.1f} ms  {len(module_times):>4} modules  heaviest: " + ", ".join(f"{name} {self_us / 1000:.1f} ms" for self_us, name in heaviest))
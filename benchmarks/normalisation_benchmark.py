@@ -0,0 +1,99 @@
+import argparse
+import os
+import sys
+import time
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_normalisation import DataNormaliser
+
+''' This script compares the vectorised card number and price normalisation in DataNormaliser, on
+millions of rows, against the same work done with a Python call per value, and against the casts
+the cleaners used before (which don't validate card numbers and parse prices as floats).
+The card numbers are 16 digits long, as the old int64 cast can't hold 19 digit numbers. Run it with:
+
+    python benchmarks/normalisation_benchmark.py --rows 5000000'''
+
+def make_columns(rows, seed=0):
+    '''
+    This function builds card number and price columns shaped like the card details PDF and the products CSV.
+
+    Args:
+        rows (int): The number of rows to generate.
+        seed (int): The seed for the random number generator.
+
+    Returns:
+        tuple: the card number pandas.Series, with "??" in front of 5% of them, and the price pandas.Series.
+    '''
+    rng = np.random.default_rng(seed)
+    card_numbers = rng.integers(10**15, 10**16, rows).astype(str)
+    card_numbers = np.where(rng.random(rows) < 0.05, np.char.add("??", card_numbers), card_numbers)
+    pounds = rng.integers(0, 1000, rows).astype(str)
+    pence = np.char.zfill(rng.integers(0, 100, rows).astype(str), 2)
+    prices = np.char.add(np.char.add(np.char.add("£", pounds), "."), pence)
+
+    return pd.Series(card_numbers, dtype=object), pd.Series(prices, dtype=object)
+
+def old_cleaner_card_numbers(card_series):
+    '''
+    This function is what clean_card_data did before: strip "?" and cast to int64, with no validation.
+    '''
+    card_series = card_series.astype("string").str.replace("?", "")
+    return card_series.astype("int64")
+
+def per_value_card_numbers(card_series):
+    '''
+    This function does the same work as DataNormaliser.normalise_card_numbers with a Python call for each value.
+    '''
+    def normalise(card_number):
+        digits = "".join(char for char in str(card_number) if char.isdigit())
+        luhn_total = 0
+        for position, digit in enumerate(reversed(digits)):
+            digit = int(digit) * 2 if position % 2 else int(digit)
+            luhn_total += digit - 9 if digit > 9 else digit
+        return digits, luhn_total % 10 == 0 and 12 <= len(digits) <= 19
+
+    return card_series.map(normalise)
+
+def old_cleaner_prices(price_series):
+    '''
+    This function is what clean_products_data did before: strip "£" with a regex and cast to float.
+    '''
+    return price_series.astype("string").str.replace("£", "", regex=True).astype(float)
+
+def per_value_prices(price_series):
+    '''
+    This function does the same work as DataNormaliser.normalise_prices_to_pence with a Python call for each value.
+    '''
+    return price_series.map(lambda price: int(Decimal(price.replace("£", "").replace(",", "")) * 100))
+
+def time_it(name, function, series, rows):
+    '''
+    This function runs function on series and prints its run time and throughput.
+    '''
+    start = time.perf_counter()
+    function(series)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:>9.2f} {rows / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare vectorised and per-value card number and price normalisation.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    card_series, price_series = make_columns(args.rows)
+    normaliser = DataNormaliser()
+
+    print(f"{args.rows:,} rows")
+    print(f"{'normalisation':<28} {'seconds':>9} {'rows/second':>14}")
+    time_it("card numbers, old cleaner", old_cleaner_card_numbers, card_series, args.rows)
+    time_it("card numbers, per value", per_value_card_numbers, card_series, args.rows)
+    time_it("card numbers, vectorised", normaliser.normalise_card_numbers, card_series, args.rows)
+    time_it("prices, old cleaner", old_cleaner_prices, price_series, args.rows)
+    time_it("prices, per value", per_value_prices, price_series, args.rows)
+    time_it("prices, vectorised", normaliser.normalise_prices_to_pence, price_series, args.rows)
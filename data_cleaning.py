@@ -1,5 +1,6 @@
 from dateutil.parser import parse
 import pandas as pd
+from data_normalisation import DataNormaliser
 
 class DatabaseCleaning:
     '''
@@ -7,6 +8,22 @@ class DatabaseCleaning:
 
     '''
 
+    def __init__(self, use_arrow=False):
+        '''
+        Args:
+            use_arrow (bool): Whether to cast string columns to Arrow-backed strings, so string operations run on pyarrow compute kernels.
+        '''
+        self.use_arrow = use_arrow
+
+    def _dtype(self, data_type):
+        # map the plain "string" dtype onto the ArrowDtype the Arrow extraction already produces,
+        # so casting an extracted column is a no-op rather than a round trip through Python strings
+        if self.use_arrow and data_type == "string":
+            import pyarrow as pa
+
+            return pd.ArrowDtype(pa.string())
+        return data_type
+
     def clean_user_data(self, user_df):
         '''
         This function is used to clean the user dataframe and return the cleaned dataframe.
@@ -30,7 +47,7 @@ class DatabaseCleaning:
         col_data_types = {'first_name': 'string', 'last_name': 'string', 'company':'string', 'email_address':'string', 'address':'string', 'country':'string', 'country_code':'string','phone_number':'string','user_uuid':'string'}
         # use a for loop to iterate through the columns and change the dtype
         for column, data_type in col_data_types.items():
-            user_df_mask[column] = user_df_mask[column].astype(data_type)
+            user_df_mask[column] = user_df_mask[column].astype(self._dtype(data_type))
 
         ## convert date columns to datetime
         user_df_mask['date_of_birth'] = user_df_mask['date_of_birth'].apply(parse)
@@ -56,19 +73,16 @@ class DatabaseCleaning:
         card_mask = card_df.loc[:,"card_provider"].isin(card_provider_list)
         df_mask = card_df[card_mask]
 
-        # drop the '?' characters in invalid card_numbers
-        # to search specifically for character, convert to string
-        df_mask['card_number'] = df_mask['card_number'].astype('string')
-        replacements = [("?", "")]
-        for char, replacement in replacements:
-            df_mask["card_number"] = df_mask["card_number"].str.replace(char, replacement)
-        # convert into int64
-        df_mask['card_number'] = df_mask['card_number'].astype('int64')
+        # drop the '?' characters in invalid card_numbers and check them with the Luhn algorithm
+        # kept as strings, as 19 digit card numbers overflow int64 and leading zeros would be lost
+        card_numbers, luhn_valid = DataNormaliser().normalise_card_numbers(df_mask['card_number'], dtype=self._dtype("string"))
+        df_mask['card_number'] = card_numbers
+        df_mask['luhn_valid'] = luhn_valid
 
         # turn other cols into strings 
         col_data_types = {'expiry_date':'string', 'card_provider':'string'}
         for column, data_type in col_data_types.items():
-            df_mask[column] = df_mask[column].astype(data_type)
+            df_mask[column] = df_mask[column].astype(self._dtype(data_type))
         
         # cast columns to datetime
         df_mask['date_payment_confirmed'] = df_mask['date_payment_confirmed'].apply(parse)
@@ -101,7 +115,7 @@ class DatabaseCleaning:
         # convert columns to string and flaot64
         col_data_types = {"latitude":"float64", "longitude":"float64", "address":"string", "locality":"string", "store_code":"string", "store_type":"string", "country_code":"string", "continent":"string"}
         for column, data_type in col_data_types.items():
-            store_info_mask_nona[column] = store_info_mask_nona[column].astype(data_type)
+            store_info_mask_nona[column] = store_info_mask_nona[column].astype(self._dtype(data_type))
 
         # staff_number has values with "accidental" letters mixed in so can't convert to int64
         store_info_mask_nona['staff_numbers'] = store_info_mask_nona['staff_numbers'].replace(["J78", "30e", "80R", "A97", "3n9"], ["78", "30", "80", "97", "39"])
@@ -127,8 +141,9 @@ class DatabaseCleaning:
             pandas.DataFrame: the DataFrame with weight column converted to kg.
         '''
         # create new columns, using regex to seperate weight and unit
-        product_df['numeric_value'] = pd.to_numeric(product_df['weight'].str.extract('(\d+.\d+|\d+)')[0], errors='coerce') # casts as a float 
-        product_df['unit'] = product_df['weight'].str.extract('([a-zA-Z]+)')
+        # the groups are named, as Arrow-backed strings only extract named groups
+        product_df['numeric_value'] = pd.to_numeric(product_df['weight'].str.extract(r'(?P<value>\d+.\d+|\d+)')['value'], errors='coerce') # casts as a float 
+        product_df['unit'] = product_df['weight'].str.extract(r'(?P<unit>[a-zA-Z]+)')['unit']
         
         # define dictionary for conversion
         conversion_factors = {'ml': 0.001, 'g': 0.001, 'kg': 1, 'k': 1}
@@ -157,27 +172,22 @@ class DatabaseCleaning:
         '''
         # create mask to filter invalid data using removed column:
         # first correct spelling mistake of 'avaliable'
-        product_df["removed"] = product_df["removed"].astype("string")
+        product_df["removed"] = product_df["removed"].astype(self._dtype("string"))
         product_df["removed"] = product_df["removed"].str.replace('Still_avaliable', 'Still_available', regex=True)
         # filter
         availability_list = ["Still_available", "Removed"] 
         availability_mask = product_df.loc[:,"removed"].isin(availability_list)
         product_mask_df = product_df[availability_mask]
 
-        # remove £ from price column and convert to float64
-        # cast as string
-        product_mask_df["product_price"] = product_mask_df["product_price"].astype("string")
-        # create new col from it while removing the £ sign
-        product_mask_df["product_price_sterling"] = product_mask_df["product_price"].str.replace("£", "", regex=True)
-        # convert to float
-        product_mask_df["product_price_sterling"] = product_mask_df["product_price_sterling"].astype(float)
+        # remove £ from price column and convert to an exact number of pence, as floats can't hold every price exactly
+        product_mask_df["product_price_pence"] = DataNormaliser().normalise_prices_to_pence(product_mask_df["product_price"])
         # delete 'product_price' column
         product_mask_df = product_mask_df.drop(["product_price"], axis=1)
 
         # cast columns to correct datatype apart from datetime
         col_data_types = {'product_name':'string', 'category':'string', 'EAN':'string', 'uuid':'string', 'product_code':'string'}
         for column, data_type in col_data_types.items():
-            product_mask_df[column] = product_mask_df[column].astype(data_type)
+            product_mask_df[column] = product_mask_df[column].astype(self._dtype(data_type))
 
         # make all product_code upper()
         product_mask_df["product_code"] = product_mask_df["product_code"].str.upper()
@@ -207,11 +217,15 @@ class DatabaseCleaning:
         
         # make product_code upper case
         df_dropped_cols["product_code"] = df_dropped_cols["product_code"].str.upper()
+
+        # card_number as the same digit-only strings as dim_card_details, so the foreign key matches
+        card_numbers, _ = DataNormaliser().normalise_card_numbers(df_dropped_cols["card_number"], dtype=self._dtype("string"))
+        df_dropped_cols["card_number"] = card_numbers
         
         # cast other columns to string
         col_data_types = {"date_uuid":"string", "user_uuid":"string", "store_code":"string", "product_code":"string"}
         for column, data_type in col_data_types.items():
-            df_dropped_cols[column] = df_dropped_cols[column].astype(data_type)
+            df_dropped_cols[column] = df_dropped_cols[column].astype(self._dtype(data_type))
         
         return df_dropped_cols
     
@@ -236,8 +250,8 @@ class DatabaseCleaning:
         time_df_mask['purchase_date'] = pd.to_datetime(time_df_mask["year"] + "-" + time_df_mask["month"]+ "-" + time_df_mask["day"])
 
         # cast timestamp and purchase_date as strings to combine
-        time_df_mask["timestamp"] = time_df_mask["timestamp"].astype("string")
-        time_df_mask["purchase_date"] = time_df_mask["purchase_date"].astype("string")
+        time_df_mask["timestamp"] = time_df_mask["timestamp"].astype(self._dtype("string"))
+        time_df_mask["purchase_date"] = time_df_mask["purchase_date"].astype(self._dtype("string"))
 
         # combine and convert to datetime as a new column
         time_df_mask["purchase_datetime"] = pd.to_datetime(time_df_mask["purchase_date"] + " " + time_df_mask["timestamp"])
@@ -248,6 +262,6 @@ class DatabaseCleaning:
         # cast the other columns as strings
         col_data_types = {"month": "int32", "year":"int32", "day":"int32", "time_period": "string", "date_uuid": "string"}
         for column, data_type in col_data_types.items():
-            time_df_mask[column] = time_df_mask[column].astype(data_type)
+            time_df_mask[column] = time_df_mask[column].astype(self._dtype(data_type))
         
         return time_df_mask 
@@ -1,15 +1,327 @@
-import boto3
-from io import StringIO
+import asyncio
+import contextlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from urllib.parse import urlsplit
+
 import pandas as pd
-import requests
-import tabula
 from database_utils import DatabaseConnector
 
+# aiohttp, boto3 and tabula (which starts a JVM) are imported by the methods that use them,
+# so importing this module only pays for the sources a stage actually reads.
+
+class HostRateLimiter:
+    '''
+    This class can be used to limit the number of concurrent requests, and the request rate, sent to each host.
+
+    One limiter can be shared by calls on successive event loops: the request rate carries over from one to the next.
+    '''
+
+    def __init__(self, max_concurrent_requests=10, requests_per_second=None):
+        '''
+        Args:
+            max_concurrent_requests (int): The maximum number of requests in flight to a single host.
+            requests_per_second (float): The maximum request rate to a single host, or None for no rate limit.
+        '''
+        self.max_concurrent_requests = max_concurrent_requests
+        self.requests_per_second = requests_per_second
+        self._semaphores = {}
+        self._semaphores_loop = None
+        self._next_request_time = {}
+
+    @contextlib.asynccontextmanager
+    async def limit(self, host):
+        '''
+        This function waits until a request to the given host is allowed and holds its slot until the request is done.
+
+        Args:
+            host (str): The host the request is sent to.
+        '''
+        loop = asyncio.get_running_loop()
+        if loop is not self._semaphores_loop:
+            # a semaphore belongs to the event loop it is used on, so a new loop gets new ones; the booked
+            # request times stay valid, as every loop's clock is time.monotonic()
+            self._semaphores, self._semaphores_loop = {}, loop
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.max_concurrent_requests))
+        async with semaphore:
+            if self.requests_per_second:
+                # book the next free time slot for this host before sleeping so waiting requests are spaced out
+                now = loop.time()
+                request_time = max(now, self._next_request_time.get(host, now))
+                self._next_request_time[host] = request_time + 1 / self.requests_per_second
+                await asyncio.sleep(request_time - now)
+            yield
+
+
+class AsyncDataExtractor:
+    '''
+    This class can be used to extract data from the API, S3 and PDF sources concurrently on one event loop.
+    '''
+
+    def __init__(self, max_concurrent_requests=10, requests_per_second=None, timeout=300, use_arrow=False, limiter=None):
+        '''
+        Args:
+            max_concurrent_requests (int): The maximum number of requests in flight to a single host.
+            requests_per_second (float): The maximum request rate to a single host, or None for no rate limit.
+            timeout (float): The overall time budget in seconds for a call to run().
+            use_arrow (bool): Whether to return DataFrames with Arrow-backed dtypes instead of object dtypes.
+            limiter (HostRateLimiter): A limiter shared with other extractors, or None for one of its own.
+        '''
+        self.limiter = limiter or HostRateLimiter(max_concurrent_requests, requests_per_second)
+        self.max_concurrent_requests = max_concurrent_requests
+        self.timeout = timeout
+        self.use_arrow = use_arrow
+        self._executor = None
+
+    def run(self, coroutine):
+        '''
+        This function runs a coroutine of this class on a new event loop within the overall timeout budget.
+
+        The blocking boto3 and tabula calls run on an executor of this call's own, which is abandoned rather than
+        waited for when the budget runs out, so the TimeoutError is raised on time.
+
+        Args:
+            coroutine (coroutine): The coroutine to run, e.g. self.retrieve_stores_data(...).
+
+        Returns:
+            The result of the coroutine.
+        '''
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_requests)
+        try:
+            return asyncio.run(asyncio.wait_for(coroutine, self.timeout))
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _in_thread(self, function, *args, **kwargs):
+        # run a blocking call in a worker thread, on run()'s executor when there is one
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    @contextlib.asynccontextmanager
+    async def _session_scope(self, session):
+        # reuse the caller's session, otherwise open one just for this call
+        if session is not None:
+            yield session
+        else:
+            import aiohttp
+
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as new_session:
+                yield new_session
+
+    async def _get(self, session, url, header=None):
+        async with self.limiter.limit(urlsplit(url).netloc):
+            async with session.get(url, headers=header) as response:
+                response.raise_for_status()
+                return await response.read()
+
+    async def _get_json(self, session, url, header):
+        async with self.limiter.limit(urlsplit(url).netloc):
+            async with session.get(url, headers=header) as response:
+                # an error body such as {"message": "Forbidden"} must not end up as a row of data
+                response.raise_for_status()
+                # the API does not always send a JSON content type
+                return await response.json(content_type=None)
+
+    def s3_client(self):
+        '''
+        This function creates a boto3 S3 client whose connect and read timeouts fit in the time budget.
+
+        Returns:
+            botocore.client.S3: The S3 client.
+        '''
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client('s3', config=Config(connect_timeout=self.timeout, read_timeout=self.timeout))
+
+    async def url_version(self, url, session=None):
+        '''
+        This function asks the server for the version of a file with a HEAD request, without downloading it.
+
+        Args:
+            url (str): The URL of the file.
+            session (aiohttp.ClientSession): An open session to send the request with, or None to open one.
+
+        Returns:
+            str: The ETag of the file, or its Last-Modified date, or None if the server sends neither.
+        '''
+        async with self._session_scope(session) as session:
+            async with self.limiter.limit(urlsplit(url).netloc):
+                async with session.head(url) as response:
+                    response.raise_for_status()
+                    return response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+    async def list_number_of_stores(self, num_stores_endpoint_url, header, session=None):
+        '''
+        This function retrieves the number of stores from an API endpoint.
+
+        Args:
+            num_stores_endpoint_url (str): The URL of the API endpoint to get the number of stores.
+            header (dict): The header containing the API key.
+            session (aiohttp.ClientSession): An open session to send the request with, or None to open one.
+
+        Returns:
+            int: The number of stores retrieved from the API.
+        '''
+        async with self._session_scope(session) as session:
+            response_json = await self._get_json(session, num_stores_endpoint_url, header)
+        number_of_stores = response_json.get("number_stores", 0)
+
+        return number_of_stores
+
+    async def retrieve_stores_data(self, store_endpoint_template, number_of_stores, header, session=None):
+        '''
+        This function retrieves data for all stores from an API concurrently and saves them in a DataFrame.
+
+        Args:
+            store_endpoint_template (str): The template URL for retrieving store data.
+            number_of_stores (int): The total number of stores.
+            header (dict): The header containing necessary authentication details.
+            session (aiohttp.ClientSession): An open session to send the requests with, or None to open one.
+
+        Returns:
+            pandas.DataFrame: A DataFrame containing the data for all stores.
+        '''
+        async with self._session_scope(session) as session:
+            full_endpoints = [store_endpoint_template + str(store_num) for store_num in range(0, number_of_stores)]
+            # gather keeps the results in store number order
+            stores_list = await asyncio.gather(*(self._get_json(session, full_endpoint, header) for full_endpoint in full_endpoints))
+
+        stores_df = pd.DataFrame(stores_list)
+        if self.use_arrow:
+            stores_df = stores_df.convert_dtypes(dtype_backend="pyarrow")
+
+        return stores_df
+
+    async def extract_from_s3(self, s3_address):
+        '''
+        This function extracts data from an S3 bucket based on the provided address.
+
+        Args:
+            s3_address (str): The S3 address specifying the bucket and object key.
+
+        Returns:
+            pandas.DataFrame: A DataFrame containing the data extracted from the S3 bucket.
+        '''
+        # split address into bucket name and object key
+        bucket_name, object_key = s3_address.replace("s3://", "").split("/", 1)
+
+        # boto3 is blocking so the download runs in a worker thread
+        def download():
+            # check logged into aws cli 'aws configure list'
+            s3 = self.s3_client()
+            response = s3.get_object(Bucket=bucket_name, Key=object_key)
+            return response['Body'].read().decode('utf-8')
+
+        async with self.limiter.limit(f"{bucket_name}.s3.amazonaws.com"):
+            content = await self._in_thread(download)
+
+        # check file type based on extension
+        _, file_extension = object_key.rsplit('.', 1) # underscore is throwaway variable
+
+        # Convert content to DataFrame based on filetype
+        read_kwargs = {"dtype_backend": "pyarrow"} if self.use_arrow else {}
+        if file_extension.lower() == 'json':
+            df = pd.read_json(StringIO(content), **read_kwargs)
+        elif file_extension.lower() == 'csv':
+            df = pd.read_csv(StringIO(content), **read_kwargs)
+
+        return df
+
+    async def retrieve_pdf_data(self, link, session=None):
+        '''
+        This function retrieves data from a PDF located at the provided link.
+
+        Args:
+            link (str): The link to the PDF.
+            session (aiohttp.ClientSession): An open session to download the PDF with, or None to open one.
+
+        Returns:
+            pandas.DataFrame: A DataFrame containing the data extracted from the PDF.
+        '''
+        async with self._session_scope(session) as session:
+            pdf_bytes = await self._get(session, link)
+
+        # tabula runs in the JVM and blocks, so parse the downloaded PDF in a worker thread
+        import tabula
+
+        pdf_dataframe_list = await self._in_thread(tabula.read_pdf, BytesIO(pdf_bytes), pages='all')
+        pdf_dataframe = pd.concat(pdf_dataframe_list, ignore_index=True) # convert list into dataframe
+        if self.use_arrow:
+            pdf_dataframe = pdf_dataframe.convert_dtypes(dtype_backend="pyarrow")
+
+        return pdf_dataframe
+
+    async def extract_source(self, source, header=None, session=None):
+        '''
+        This function extracts the data of one network source, as defined in pipeline_config.yaml.
+
+        Args:
+            source (dict): The source, with a "type" of pdf (and a "link"), api (and a "number_stores_endpoint" and
+                "store_endpoint") or s3 (and an "address").
+            header (dict): The header containing the API key, for api sources.
+            session (aiohttp.ClientSession): An open session to send the requests with, or None to open one.
+
+        Returns:
+            pandas.DataFrame: A DataFrame containing the data of the source.
+        '''
+        if source["type"] == "pdf":
+            return await self.retrieve_pdf_data(source["link"], session)
+        elif source["type"] == "api":
+            number_of_stores = await self.list_number_of_stores(source["number_stores_endpoint"], header, session)
+            return await self.retrieve_stores_data(source["store_endpoint"], number_of_stores, header, session)
+        elif source["type"] == "s3":
+            return await self.extract_from_s3(source["address"])
+        else:
+            raise ValueError(f"Source type '{source['type']}' is not a network source")
+
+    async def extract_sources(self, sources, header=None, return_exceptions=False):
+        '''
+        This function extracts several network sources at once, on one session and under one per-host limit.
+
+        Args:
+            sources (dict): A dictionary mapping a name to each source, as taken by extract_source.
+            header (dict): The header containing the API key, for api sources.
+            return_exceptions (bool): Whether a source that fails gets its exception in place of its DataFrame,
+                instead of the first failure being raised.
+
+        Returns:
+            dict: A dictionary mapping each name in sources to the DataFrame of its data.
+        '''
+        async with self._session_scope(None) as session:
+            extractions = (self.extract_source(source, header, session) for source in sources.values())
+            dataframes = await asyncio.gather(*extractions, return_exceptions=return_exceptions)
+
+        return dict(zip(sources, dataframes))
+
+
 class DataExtractor:
     '''
     This class can be used to extract data from different data sources.
+
+    The network methods are thin synchronous wrappers around AsyncDataExtractor.
     ''' 
 
+    def __init__(self, max_concurrent_requests=10, requests_per_second=None, timeout=300, use_arrow=False):
+        '''
+        Args:
+            max_concurrent_requests (int): The maximum number of requests in flight to a single host.
+            requests_per_second (float): The maximum request rate to a single host, or None for no rate limit.
+            timeout (float): The time budget in seconds for each network method call.
+            use_arrow (bool): Whether to return DataFrames with Arrow-backed dtypes instead of object dtypes.
+        '''
+        self.max_concurrent_requests = max_concurrent_requests
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.use_arrow = use_arrow
+        # shared by every call, so e.g. number_stores and the store_details requests after it count against one rate limit
+        self.limiter = HostRateLimiter(max_concurrent_requests, requests_per_second)
+
+    def _async_extractor(self):
+        # a new instance per call, as each call runs on an event loop of its own
+        return AsyncDataExtractor(self.max_concurrent_requests, self.requests_per_second, self.timeout, self.use_arrow, self.limiter)
+
     def read_rds_table(self, instance_of_DbCon_class, table_name, engine):
         '''
         This function reads a table from an RDS database using the provided SQLAlchemy engine instance.
@@ -22,16 +334,34 @@ class DataExtractor:
         Returns:
             pandas.DataFrame: A DataFrame containing the data from the specified table.
         '''
+        # Arrow-backed columns skip the Python object allocated for every cell
+        read_kwargs = {"dtype_backend": "pyarrow"} if self.use_arrow else {}
         if table_name == "legacy_users":
-            df_legacy_users = pd.read_sql_table(table_name="legacy_users", con=engine) 
+            df_legacy_users = pd.read_sql_table(table_name="legacy_users", con=engine, **read_kwargs) 
             return df_legacy_users
         elif table_name == "orders_table":
-            orders_df = pd.read_sql_table(table_name="orders_table", con=engine)
+            orders_df = pd.read_sql_table(table_name="orders_table", con=engine, **read_kwargs)
             return orders_df
         elif table_name == "legacy_store_details":
-            legacy_stores_df = pd.read_sql_table(table_name="legacy_store_details", con=engine)
+            legacy_stores_df = pd.read_sql_table(table_name="legacy_store_details", con=engine, **read_kwargs)
             return legacy_stores_df
 
+    def rds_table_row_count(self, table_name, engine):
+        '''
+        This function counts the rows of a table in the RDS database without reading it.
+
+        Args:
+            table_name (str): The name of the table to count.
+            engine (sqlalchemy.engine.base.Engine): The SQLAlchemy engine connected to the RDS database.
+
+        Returns:
+            int: The number of rows in the table.
+        '''
+        from sqlalchemy import func, select, table
+
+        with engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(table(table_name))).scalar()
+
     def retrieve_pdf_data(self, link):
         '''
         This function retrieves data from a PDF located at the provided link.
@@ -42,12 +372,24 @@ class DataExtractor:
         Returns:
             pandas.DataFrame: A DataFrame containing the data extracted from the PDF.
         '''
-        # use tabula to reads remote pdf into list of DataFrame using tabula
         self.link = link
-        pdf_dataframe_list = tabula.read_pdf(self.link, pages='all') 
-        pdf_dataframe = pd.concat(pdf_dataframe_list, ignore_index=True) # convert list into dataframe
-        
-        return pdf_dataframe
+        extractor = self._async_extractor()
+
+        return extractor.run(extractor.retrieve_pdf_data(self.link))
+
+    def pdf_version(self, link):
+        '''
+        This function retrieves the ETag, or failing that the Last-Modified date, of the PDF at the provided link without downloading it.
+
+        Args:
+            link (str): The link to the PDF.
+
+        Returns:
+            str: The ETag or Last-Modified date of the PDF, or None if the server sends neither.
+        '''
+        extractor = self._async_extractor()
+
+        return extractor.run(extractor.url_version(link))
 
     def list_number_of_stores(self, num_stores_endpoint_url, header):
         '''
@@ -60,10 +402,9 @@ class DataExtractor:
         Returns:
             int: The number of stores retrieved from the API.
         '''
-        response = requests.get(num_stores_endpoint_url, headers=header)
-        number_of_stores = response.json().get("number_stores", 0)
-        
-        return number_of_stores 
+        extractor = self._async_extractor()
+
+        return extractor.run(extractor.list_number_of_stores(num_stores_endpoint_url, header))
     
     def retrieve_stores_data(self, store_endpoint_template, number_of_stores, header):
         '''
@@ -77,19 +418,9 @@ class DataExtractor:
         Returns:
             pandas.DataFrame: A DataFrame containing the data for all stores.
         '''
-        stores_list = []
-        store_num = 1
-      
-        for store_num in range(0, number_of_stores):
-            full_endpoint = store_endpoint_template + str(store_num)
-            response = requests.get(full_endpoint, headers=header)
-            store_data = response.json()
-            stores_list.append(store_data)
-            store_num += 1
+        extractor = self._async_extractor()
 
-        stores_df = pd.DataFrame(stores_list)
-    
-        return stores_df
+        return extractor.run(extractor.retrieve_stores_data(store_endpoint_template, number_of_stores, header))
 
     def extract_from_s3(self, s3_address):
         '''
@@ -101,26 +432,41 @@ class DataExtractor:
         Returns:
             pandas.DataFrame: A DataFrame containing the data extracted from the S3 bucket.
         '''
-        # check logged into aws cli 'aws configure list'
-        s3 = boto3.client('s3')
-        # split address into bucket name and object key
-        bucket_name, object_key = s3_address.replace("s3://", "").split("/", 1)
+        extractor = self._async_extractor()
 
-        # check file type based on extension
-        _, file_extension = object_key.rsplit('.', 1) # underscore is throwaway variable
-        
-        # Download the CSV file from S3
-        response = s3.get_object(Bucket=bucket_name, Key=object_key)
-        content = response['Body'].read().decode('utf-8')
-        
-        # Convert CSV content to DataFrame based on filetype
-        if file_extension.lower() == 'json':
-            df = pd.read_json(content)
-        elif file_extension.lower() == 'csv':
-            df = pd.read_csv(StringIO(content))
+        return extractor.run(extractor.extract_from_s3(s3_address))
 
-        return df
-    
+    def extract_sources(self, sources, header=None, return_exceptions=False):
+        '''
+        This function extracts several network sources concurrently on one event loop, within one time budget.
+
+        Args:
+            sources (dict): A dictionary mapping a name to each source, as taken by AsyncDataExtractor.extract_source.
+            header (dict): The header containing the API key, for api sources.
+            return_exceptions (bool): Whether a source that fails gets its exception in place of its DataFrame.
+
+        Returns:
+            dict: A dictionary mapping each name in sources to the DataFrame of its data.
+        '''
+        extractor = self._async_extractor()
+
+        return extractor.run(extractor.extract_sources(sources, header, return_exceptions))
+
+    def s3_object_version(self, s3_address):
+        '''
+        This function retrieves the ETag of an S3 object without downloading it, which changes whenever the object does.
+
+        Args:
+            s3_address (str): The S3 address specifying the bucket and object key.
+
+        Returns:
+            str: The ETag of the S3 object.
+        '''
+        s3 = self._async_extractor().s3_client()
+        bucket_name, object_key = s3_address.replace("s3://", "").split("/", 1)
+        response = s3.head_object(Bucket=bucket_name, Key=object_key)
+
+        return response['ETag']
 
     """
     def read_rds_table(self, instance_of_DbCon_class, table_name, engine):
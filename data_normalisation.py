@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+class DataNormaliser:
+    '''
+    This class can be used to normalise card number and money columns with vectorised numpy kernels.
+
+    Each column is turned into one matrix of character codes, with a row per value and a column per character
+    position, and is processed in a single pass over the character positions, each step covering every value at once.
+    '''
+
+    def _code_matrix(self, series):
+        # one row of unicode code points per value, padded on the right with zeros to the longest value
+        if not pd.api.types.is_string_dtype(series.dtype):
+            # numbers as text first, as an Arrow numeric column with nulls can't take a string na_value
+            series = series.astype("string")
+        values = series.to_numpy(dtype=str, na_value="")
+        return values, values.view(np.uint32).reshape(len(values), values.dtype.itemsize // 4)
+
+    def _integral_floats(self, float_series):
+        # floats as nullable integers, so 4.971858637664481e15 reads as its 16 digits rather than "4971858637664481.0";
+        # fractions, and numbers past 2**53 which a float may already have rounded, become missing
+        values = pd.to_numeric(float_series, errors="coerce").astype("Float64")
+        exact = (values % 1 == 0) & (values.abs() <= 2**53)
+        return values.where(exact).astype("Int64")
+
+    def normalise_card_numbers(self, card_series, dtype="string"):
+        '''
+        This function strips every character but the digits from the card numbers and checks them with the Luhn algorithm.
+
+        The card numbers stay strings, so 19 digit numbers don't overflow int64 and leading zeros are kept.
+
+        Args:
+            card_series (pandas.Series): the card numbers, as strings, integers or floats, e.g. "??4971858637664481".
+                Floats that aren't whole numbers, or are too large to hold a card number exactly, are treated as missing.
+            dtype (str or pandas dtype): the string dtype of the returned card numbers.
+
+        Returns:
+            tuple: a pandas.Series of the digit-only card numbers (missing where there were no digits) and a
+            boolean pandas.Series which is True where the number has 12 to 19 digits and passes the Luhn check.
+        '''
+        if pd.api.types.is_float_dtype(card_series.dtype) or pd.api.types.infer_dtype(card_series, skipna=True) == "floating":
+            values, codes = self._code_matrix(self._integral_floats(card_series))
+        else:
+            values, codes = self._code_matrix(card_series)
+
+        # blank out everything but the digits, then move the digits to the front of the rows that had anything else
+        # in them (a stable sort on "is blank" keeps the digits in order), leaving fixed-width rows of digit codes
+        is_digit = (codes - ord("0")) < 10 # unsigned, so every other character wraps round to a large number
+        digit_codes = np.where(is_digit, codes, 0)
+        has_other = (~is_digit & (codes != 0)).any(axis=1)
+        other_rows = digit_codes[has_other]
+        digit_codes[has_other] = np.take_along_axis(other_rows, np.argsort(other_rows == 0, axis=1, kind="stable"), axis=1)
+
+        # Luhn: from the check digit on the right, double every second digit and subtract 9 from results over 9
+        luhn_total = np.zeros(len(values), dtype=np.uint16)
+        lengths = np.zeros(len(values), dtype=np.uint8)
+        double_next = np.zeros(len(values), dtype=bool)
+        for column in np.ascontiguousarray(digit_codes.T[::-1]).astype(np.uint8):
+            present = column != 0
+            digit = np.where(present, column - np.uint8(ord("0")), np.uint8(0))
+            luhn_total += np.where(double_next, digit * np.uint8(2) - np.uint8(9) * (digit >= 5), digit)
+            double_next ^= present
+            lengths += present
+        luhn_valid = (luhn_total % 10 == 0) & (lengths >= 12) & (lengths <= 19)
+
+        card_numbers = digit_codes.view(values.dtype).ravel()
+        card_numbers = pd.Series(card_numbers, index=card_series.index, dtype=dtype).mask(lengths == 0)
+
+        return card_numbers, pd.Series(luhn_valid, index=card_series.index)
+
+    def _numbers_to_pence(self, number_series):
+        # numbers are scaled to pence rather than read from their repr, so 0.1 + 0.2 (0.30000000000000004) is 30 pence;
+        # as with text, a price that isn't a whole number of pence, allowing for float rounding, is invalid
+        pounds = pd.to_numeric(number_series, errors="coerce").astype("Float64").to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            scaled = pounds * 100
+            pence = np.rint(scaled)
+            valid = np.isfinite(scaled) & (scaled >= 0) & (pence < 2**53) & (np.abs(scaled - pence) <= 1e-6 + 1e-12 * np.abs(scaled))
+        return pd.Series(pd.arrays.IntegerArray(np.where(valid, pence, 0).astype(np.int64), ~valid), index=number_series.index)
+
+    def normalise_prices_to_pence(self, price_series):
+        '''
+        This function converts prices such as "£1,299.99" into an exact number of pence.
+
+        Pound signs, commas and spaces are ignored. Values with any other character, more than one decimal point
+        or more than two decimal places are invalid and become missing. Numbers are multiplied by 100 and rounded,
+        and those more than float rounding away from a whole number of pence, or negative, are invalid too.
+
+        Args:
+            price_series (pandas.Series): the prices, as strings or numbers, e.g. "£1,299.99" or 0.1 + 0.2.
+
+        Returns:
+            pandas.Series: the prices in pence, as nullable Int64.
+        '''
+        is_number_dtype = pd.api.types.is_numeric_dtype(price_series.dtype) and not pd.api.types.is_bool_dtype(price_series.dtype)
+        if is_number_dtype or pd.api.types.infer_dtype(price_series, skipna=True) in ("floating", "integer", "mixed-integer-float"):
+            return self._numbers_to_pence(price_series)
+
+        values, codes = self._code_matrix(price_series)
+
+        # read the digits left to right into one integer, counting those after the point
+        whole_number = np.zeros(len(values), dtype=np.int64)
+        digit_count = np.zeros(len(values), dtype=np.int16)
+        pence_digits = np.zeros(len(values), dtype=np.int16)
+        seen_point = np.zeros(len(values), dtype=bool)
+        valid = np.ones(len(values), dtype=bool)
+        for column in np.ascontiguousarray(codes.T):
+            digit = column - ord("0")
+            is_digit = digit < 10 # unsigned, so every other character wraps round to a large number
+            is_point = column == ord(".")
+            valid &= is_digit | is_point | (column == 0) | (column == ord("£")) | (column == ord(",")) | (column == ord(" "))
+            valid &= ~(is_point & seen_point)
+            whole_number = np.where(is_digit, whole_number * 10 + digit, whole_number)
+            digit_count += is_digit
+            pence_digits += is_digit & seen_point
+            seen_point |= is_point
+        # more than 16 pounds digits could have overflowed int64
+        valid &= (digit_count > 0) & (pence_digits <= 2) & (digit_count - pence_digits <= 16)
+
+        # scale to pence, e.g. "£9.5" is read as 95 with one digit after the point
+        pence = np.where(valid, whole_number * 10 ** np.where(valid, 2 - pence_digits, 0).astype(np.int64), 0)
+
+        return pd.Series(pd.arrays.IntegerArray(pence, ~valid), index=price_series.index)
@@ -1,4 +1,3 @@
-from sqlalchemy import create_engine, text, inspect
 import yaml
 
 class DatabaseConnector:
@@ -34,6 +33,9 @@ class DatabaseConnector:
         Returns:
             sqlalchemy.engine.base.Engine: A SQLAlchemy engine connected to the specified database.
         '''
+        # sqlalchemy is imported here rather than at module load, as reading a YAML file doesn't need it
+        from sqlalchemy import create_engine
+
         # Read database credentials from the specified YAML file
         dict_yaml_func = self.read_db_creds(file)
 
@@ -53,6 +55,8 @@ class DatabaseConnector:
         Returns:
             list: A list of table names in the 'public' schema.
         '''
+        from sqlalchemy import inspect, text
+
         # Create the database engine
         engine = self.init_db_engine(file) 
         # Inspect the structure of the database
@@ -70,7 +74,7 @@ class DatabaseConnector:
         
         return unpacked_tuples_list
     
-    def upload_to_db(self, input_df, table_name, file):
+    def upload_to_db(self, input_df, table_name, file, chunksize=None):
         '''
         This function uploads a Pandas DataFrame to the specified table in the connected PostgreSQL database. 
 
@@ -78,9 +82,187 @@ class DatabaseConnector:
             input_df (pandas.DataFrame): The DataFrame to be uploaded to the database.
             table_name (str): The name of the table to which the DataFrame should be uploaded.
             file (str): Path to the YAML file containing the database credentials.
+            chunksize (int): The number of rows inserted per batch, or None to insert all rows at once.
         
         '''  
         eng_con = self.init_db_engine(file)
+        # to_sql's own DROP TABLE fails while another table's foreign keys point at this one
+        self._drop_table(eng_con, table_name)
         # creates table
-        input_df.to_sql(table_name, eng_con, if_exists='replace', index=False)  
+        input_df.to_sql(table_name, eng_con, if_exists='replace', index=False, chunksize=chunksize)  
+
+
+    def copy_to_db(self, input_df, table_name, file):
+        '''
+        This function uploads a Pandas DataFrame to the specified table using PostgreSQL COPY instead of row-by-row inserts.
+
+        The rows are written as CSV text by pyarrow's CSV writer, straight from the Arrow buffers, so no Python object
+        is created for each cell, and streamed to a text-format COPY ... FROM STDIN (FORMAT csv).
+
+        Args:
+            input_df (pandas.DataFrame): The DataFrame to be uploaded to the database.
+            table_name (str): The name of the table to which the DataFrame should be uploaded.
+            file (str): Path to the YAML file containing the database credentials.
+        '''
+        import pandas as pd
+        import pyarrow as pa
+        from psycopg2 import sql
+
+        eng_con = self.init_db_engine(file)
+        # creates (or replaces) the empty table with the column types to_sql would give it: they are inferred from the
+        # whole frame, as an object column's type depends on the values in it (an empty frame makes every one TEXT)
+        create_statement = pd.io.sql.get_schema(input_df, table_name, con=eng_con)
+        raw_connection = eng_con.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(table_name)))
+                cursor.execute(create_statement)
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
+
+        self._copy_table(eng_con, pa.Table.from_pandas(input_df, preserve_index=False), table_name)
+
+    def _drop_table(self, engine, table_name):
+        # drop a table along with the foreign keys of other tables that reference it; the schema stage adds them back
+        from psycopg2 import sql
+
+        raw_connection = engine.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(table_name)))
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
+
+    def _copy_table(self, engine, arrow_table, table_name):
+        # COPY the rows of an Arrow table into an existing table on a connection of its own;
+        # pyarrow's CSV writer and psycopg2's COPY both release the GIL, so this can run in threads
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        from psycopg2 import sql
+
+        csv_buffer = pa.BufferOutputStream()
+        pa_csv.write_csv(arrow_table, csv_buffer, write_options=pa_csv.WriteOptions(include_header=False))
+
+        raw_connection = engine.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                copy_statement = sql.SQL("COPY {} FROM STDIN WITH (FORMAT csv)").format(sql.Identifier(table_name))
+                cursor.copy_expert(copy_statement, pa.BufferReader(csv_buffer.getvalue()))
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
+
+    def copy_partitioned_to_db(self, input_df, table_name, file, partition_column, partitions=4, workers=None):
+        '''
+        This function uploads a Pandas DataFrame to a table partitioned on one column, loading the partitions in parallel with COPY.
+
+        The values of partition_column are hashed into buckets on the client by plan_partitions, and each bucket becomes a LIST partition. 
+        As the rows of each partition are known up front, every worker COPYs straight into its own partition on its own connection.
+        Rows with a NULL partition key, and any rows inserted later with a new key, go to the DEFAULT partition.
+
+        Args:
+            input_df (pandas.DataFrame): The DataFrame to be uploaded to the database.
+            table_name (str): The name of the partitioned table, which replaces any existing table of that name.
+            file (str): Path to the YAML file containing the database credentials.
+            partition_column (str): The column to partition the table on, e.g. store_code.
+            partitions (int): The number of hash buckets, and so partitions, to split the rows into.
+            workers (int): The number of partitions loaded at once, or None for one worker per partition.
+
+        Returns:
+            dict: A dictionary mapping each partition name to the number of rows loaded into it.
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+
+        import pandas as pd
+        from psycopg2 import sql
+
+        eng_con = self.init_db_engine(file)
+        partition_plan = self.plan_partitions(input_df, table_name, partition_column, partitions)
+
+        # same column types as to_sql would create, inferred from the whole frame, with the partitioning added on
+        create_statement = pd.io.sql.get_schema(input_df, table_name, con=eng_con)
+        raw_connection = eng_con.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(table_name)))
+                cursor.execute(sql.SQL("{} PARTITION BY LIST ({})").format(sql.SQL(create_statement), sql.Identifier(partition_column)))
+                for partition_name, (bucket_keys, _) in partition_plan.items():
+                    if bucket_keys is None:
+                        cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+                            sql.Identifier(partition_name), sql.Identifier(table_name)))
+                    else:
+                        cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES IN ({})").format(
+                            sql.Identifier(partition_name), sql.Identifier(table_name), sql.SQL(", ").join(map(sql.Literal, bucket_keys))))
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
+
+        # each worker holds its own connection, so PostgreSQL parses the partitions in separate backends
+        with ThreadPoolExecutor(max_workers=workers or len(partition_plan)) as executor:
+            futures = [executor.submit(self._copy_table, eng_con, partition_table, partition_name) for partition_name, (_, partition_table) in partition_plan.items()]
+            for future in futures:
+                future.result()
+
+        return {partition_name: partition_table.num_rows for partition_name, (_, partition_table) in partition_plan.items()}
+
+    def plan_partitions(self, input_df, table_name, partition_column, partitions):
+        '''
+        This function splits a Pandas DataFrame into the LIST partitions copy_partitioned_to_db creates, without touching the database.
+
+        Each distinct value of partition_column is hashed into one of the buckets with crc32, which, unlike Python's hash(),
+        is the same on every run. A bucket without any values gets no partition, as a LIST partition needs at least one.
+        Rows with a NULL key go to the DEFAULT partition, which comes last.
+
+        Args:
+            input_df (pandas.DataFrame): The DataFrame to split.
+            table_name (str): The name of the partitioned table, which the partition names start with.
+            partition_column (str): The column to partition the table on, e.g. store_code.
+            partitions (int): The number of hash buckets.
+
+        Returns:
+            dict: A dictionary mapping each partition name to a tuple of its list of keys (None for the DEFAULT
+            partition) and its rows as a pyarrow.Table.
+        '''
+        import zlib
+
+        import numpy as np
+        import pyarrow as pa
+
+        keys = input_df[partition_column]
+        bucket_of_key = {key: zlib.crc32(str(key).encode()) % partitions for key in keys.dropna().unique().tolist()}
+        buckets = keys.map(bucket_of_key).fillna(-1).to_numpy(dtype=np.int64)
+
+        # convert to Arrow once, in the calling thread, and sort the rows by bucket so that each
+        # partition is a zero-copy slice of the one table; the workers then only run GIL-free pyarrow and COPY code
+        order = np.argsort(buckets, kind="stable")
+        sorted_table = pa.Table.from_pandas(input_df, preserve_index=False).take(pa.array(order))
+        bucket_starts = np.searchsorted(buckets[order], np.arange(-1, partitions + 1))
+
+        def bucket_rows(bucket):
+            start, end = bucket_starts[bucket + 1], bucket_starts[bucket + 2]
+            return sorted_table.slice(start, end - start)
+
+        partition_plan = {}
+        for bucket in range(partitions):
+            bucket_keys = [key for key, key_bucket in bucket_of_key.items() if key_bucket == bucket]
+            if bucket_keys:
+                partition_plan[f"{table_name}_p{bucket}"] = (bucket_keys, bucket_rows(bucket))
+        partition_plan[f"{table_name}_default"] = (None, bucket_rows(-1))
+
+        return partition_plan
+
+    def stage_to_parquet(self, input_df, path):
+        '''
+        This function writes a Pandas DataFrame to a Parquet file for staging, e.g. before a bulk load.
+
+        Args:
+            input_df (pandas.DataFrame): The DataFrame to be staged.
+            path (str): Path of the Parquet file to write.
+        '''
+        import pyarrow as pa
+        import pyarrow.parquet as pq
 
+        arrow_table = pa.Table.from_pandas(input_df, preserve_index=False)
+        pq.write_table(arrow_table, path)
@@ -1,158 +1,484 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import yaml
-import psycopg2
-from psycopg2 import sql
-from sqlalchemy import create_engine, text
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+from datetime import datetime
 
 from database_utils import DatabaseConnector
-from data_cleaning import DatabaseCleaning
-from data_extraction import DataExtractor
+
+# The heavy dependencies (pandas, boto3, tabula, aiohttp, psycopg2, numpy and matplotlib) are
+# imported inside the stages that need them, so a schema-only or query-only run starts quickly.
 
 ''' This is the script where I will use the three different classes (DatabaseConnector,
 DataExtractor and DatabaseCleaning) to retrive data from a variety of sources, clean 
 the data and upload to the sales_data database in the relational database management 
 system PostgreSQL. Finally, it will run two sql scripts which will create the database schema 
-and run business queries on it, visualising one query with a piechart.'''
+and run business queries on it, visualising one query with a piechart.
+
+The sources, cleaners and target of every table are defined in pipeline_config.yaml. Each
+stage builds everything it needs from that config, so any subset of stages can be run on
+its own, and the table stages can run in parallel worker processes:
+
+    python main.py                                  # run every stage
+    python main.py dim_users orders_table           # only these tables
+    python main.py schema queries                   # only the SQL scripts
+    python main.py --workers 4                      # table stages in 4 processes
+
+Each stage checkpoints its output, so rerunning after a failure skips the stages that
+already finished and resumes at the one that failed:
 
-def user_data():
+    python main.py --force dim_date_times           # rerun this stage from scratch'''
+
+SQL_STAGES = ["schema", "queries"]
+NETWORK_SOURCES = ["pdf", "api", "s3"]
+
+def load_pipeline_config(file):
     '''
-    This function retrieves, cleans, and uploads user data from an AWS RDS database to a new table in the sales_data database.
+    This function reads the pipeline definition from a YAML file.
+
+    Args:
+        file (str): Path to the YAML file containing the pipeline definition.
 
     Returns:
-        pandas.DataFrame: A cleaned DataFrame containing user data, which has also been uploaded to the "dim_users" table.
+        dict: python dictionary containing the pipeline definition.
     '''
-    # create instance of DataExtractor class 
-    extract_rds_data = DataExtractor()
-    # Get the users table name
-    legacy_users_table_name = get_table_names[1]
-    # Use it to read in/retrieve the data from the RDS table, which returns a dataframe
-    users_df = extract_rds_data.read_rds_table(database_connector, legacy_users_table_name, engine)
+    return DatabaseConnector().read_db_creds(file)
 
-    # Create an instance of DatabaseCleaning class
-    clean_user = DatabaseCleaning()
-    # use clean_user_data() method to clean the data
-    clean_user_df = clean_user.clean_user_data(users_df)
+def extract_table(source, config, database_connector, extractor):
+    '''
+    This function retrieves the raw data for one table stage from its source.
 
-    # Upload to a new table called dim_users in SQAlchemy sales_data database.
-    database_connector.upload_to_db(clean_user_df, "dim_users", 'db_local_creds.yaml')
-    return clean_user_df
+    Args:
+        source (dict): The source section of the table stage, with a "type" of rds, pdf, api or s3.
+        config (dict): The pipeline definition.
+        database_connector (DatabaseConnector): An instance of the DatabaseConnector class.
+        extractor (DataExtractor): An instance of the DataExtractor class.
 
-def card_data():
+    Returns:
+        pandas.DataFrame: A DataFrame containing the uncleaned data.
     '''
-    This function retrieves, cleans, and uploads card data from a PDF document in an AWS S3 bucket into a new table in the sales_data database.
+    if source["type"] == "rds":
+        # Use the RDS credentials to create an SQLAlchemy database engine to connect to the RDS
+        engine = database_connector.init_db_engine(config["source_creds"])
+        return extractor.read_rds_table(database_connector, source["table"], engine)
+    elif source["type"] == "pdf":
+        return extractor.retrieve_pdf_data(source["link"])
+    elif source["type"] == "api":
+        # Use read_db_creds method to read yaml file with api key
+        api_header_details = database_connector.read_db_creds(config["api_key"])
+        total_stores = extractor.list_number_of_stores(source["number_stores_endpoint"], api_header_details)
+        return extractor.retrieve_stores_data(source["store_endpoint"], total_stores, api_header_details)
+    elif source["type"] == "s3":
+        return extractor.extract_from_s3(s3_address(source, database_connector))
+    else:
+        raise ValueError(f"Unknown source type '{source['type']}'")
+
+def s3_address(source, database_connector):
+    '''
+    This function looks up the address of an S3 source, which is either in the config or in its own yaml file.
+
+    Args:
+        source (dict): The source section of the table stage.
+        database_connector (DatabaseConnector): An instance of the DatabaseConnector class.
 
     Returns:
-        pandas.DataFrame: A cleaned DataFrame containing card data, which has also been uploaded to the "dim_card_details" table.
+        str: The S3 address, e.g. s3://data-handling-public/products.csv.
     '''
-    # Create instance of DBConnector class
-    extract_pdf_data = DataExtractor()
-    # takes in uncleaned df as arg, sets it to cleaned_df variable
-    card_details_df = extract_pdf_data.retrieve_pdf_data('https://data-handling-public.s3.eu-west-1.amazonaws.com/card_details.pdf')
-    
-    # Create Cleaning instanct
-    card_cleaning = DatabaseCleaning()
-    # Use clean_card_data method to clean df
-    clean_card_df = card_cleaning.clean_card_data(card_details_df)
-    
-    # upload to a new table called dim_card_details in SQAlchemy sales_data database
-    database_connector.upload_to_db(clean_card_df, "dim_card_details", 'db_local_creds.yaml')
-    
-    return clean_card_df
+    return source.get("address") or database_connector.read_db_creds(source["address_file"])
 
-def stores_data():
+def load_table(clean_df, table_config, config, database_connector):
+    '''
+    This function uploads a cleaned DataFrame to its target using the loader of the table stage.
+
+    Args:
+        clean_df (pandas.DataFrame): The cleaned DataFrame.
+        table_config (dict): The table stage definition.
+        config (dict): The pipeline definition.
+        database_connector (DatabaseConnector): An instance of the DatabaseConnector class.
+    '''
+    loader = table_config.get("loader", "to_sql")
+    target = table_config["target"]
+    if loader == "to_sql":
+        database_connector.upload_to_db(clean_df, target, config["target_creds"], chunksize=table_config.get("chunk_size"))
+    elif loader == "copy":
+        database_connector.copy_to_db(clean_df, target, config["target_creds"])
+    elif loader == "partitioned":
+        partition_rows = database_connector.copy_partitioned_to_db(clean_df, target, config["target_creds"], table_config["partition_column"],
+                                                                   table_config.get("partitions", 4), table_config.get("workers"))
+        print(f"Loaded partitions of '{target}': {partition_rows}")
+    elif loader == "parquet":
+        os.makedirs(config.get("staging_dir", "staging"), exist_ok=True)
+        database_connector.stage_to_parquet(clean_df, os.path.join(config.get("staging_dir", "staging"), f"{target}.parquet"))
+    else:
+        raise ValueError(f"Unknown loader '{loader}'")
+
+def hash_input_version(version_parts):
     '''
-    This function retrieves, cleans, and uploads stores data using an API into a new table in the sales_data database.
+    This function hashes everything a stage's output depends on into one input version.
+
+    Args:
+        version_parts (dict): The definition of the stage and the versions of its inputs.
 
     Returns:
-        pandas.DataFrame: A cleaned DataFrame containing store data, which has also been uploaded to the "dim_store_details" table.
+        str: The hex digest of the input version.
     '''
-    retrieve_store_endpoint = "https://aqj7u5id95.execute-api.eu-west-1.amazonaws.com/prod/store_details/" # number of stores will be added onto the end of this
-    # Use retrieve_stores_data method to return the df
-    store_info_df = api_retrieval.retrieve_stores_data(retrieve_store_endpoint, total_stores, api_header_details)
+    return hashlib.sha256(json.dumps(version_parts, sort_keys=True, default=str).encode()).hexdigest()
 
-    # clean stores_df
-    store_cleaning = DatabaseCleaning()
-    clean_store_df = store_cleaning.clean_store_data(store_info_df)
+def table_input_version(table_config, config, database_connector, extractor):
+    '''
+    This function works out the input version of a table stage from its definition, the cleaning code and the version of its source.
 
-    # Upload to a new table called dim_store_details in SQAlchemy sales_data database
-    database_connector.upload_to_db(clean_store_df, "dim_store_details", 'db_local_creds.yaml')
+    The source version is the ETag of an S3 object, the ETag or Last-Modified date of the PDF, the number of stores
+    the API reports and the row count of an RDS table. Edits to an RDS table that keep its row count, or a PDF served
+    with neither header, are not noticed, so such a stage has to be rerun with --force.
 
-    return clean_store_df
+    Args:
+        table_config (dict): The table stage definition.
+        config (dict): The pipeline definition.
+        database_connector (DatabaseConnector): An instance of the DatabaseConnector class.
+        extractor (DataExtractor): An instance of the DataExtractor class.
 
-def product_data():
+    Returns:
+        str: The hex digest of the input version.
+    '''
+    import data_cleaning
+    import data_normalisation
+
+    version_parts = {"table": table_config, "use_arrow": config.get("use_arrow", False)}
+    # a change to the cleaners must invalidate the cleaned data checkpointed by the old code
+    version_parts["cleaning_code"] = hashlib.sha256((inspect.getsource(data_cleaning) + inspect.getsource(data_normalisation)).encode()).hexdigest()
+
+    source = table_config["source"]
+    if source["type"] == "rds":
+        engine = database_connector.init_db_engine(config["source_creds"])
+        version_parts["rds_row_count"] = extractor.rds_table_row_count(source["table"], engine)
+    elif source["type"] == "pdf":
+        version_parts["pdf_version"] = extractor.pdf_version(source["link"])
+    elif source["type"] == "api":
+        api_header_details = database_connector.read_db_creds(config["api_key"])
+        version_parts["number_stores"] = extractor.list_number_of_stores(source["number_stores_endpoint"], api_header_details)
+    elif source["type"] == "s3":
+        version_parts["s3_object_version"] = extractor.s3_object_version(s3_address(source, database_connector))
+
+    return hash_input_version(version_parts)
+
+def read_completion_marker(checkpoint_dir, stage_name):
     '''
-    This function retrieves, cleans, and uploads product data from a csv file in an s3 bucket into a new table in the sales_data database.
+    This function reads the completion marker a stage wrote when it last finished.
+
+    Args:
+        checkpoint_dir (str): The directory the checkpoints are written to.
+        stage_name (str): The name of the stage.
 
     Returns:
-        pandas.DataFrame: A cleaned DataFrame containing product data, which has also been uploaded to the "dim_products" table.
+        dict: The completion marker, or None if the stage has not finished yet.
     '''
-    # S3 URI:
-    s3_products_address = database_connector.read_db_creds('s3_url.yaml')
+    marker_path = os.path.join(checkpoint_dir, f"{stage_name}.done")
+    if not os.path.exists(marker_path):
+        return None
+    with open(marker_path, 'r') as marker_file:
+        return json.load(marker_file)
 
-    # use the extract_from_s3 method to input the s3 address and return a dataframe
-    get_product_details = DataExtractor()
-    precleaned_product_df = get_product_details.extract_from_s3(s3_products_address)
-    
-    # Use convert_product_weights method to convert weights column to same unit (kg)
-    clean_product_data = DatabaseCleaning()
-    product_weight_kg_df = clean_product_data.convert_product_weights(precleaned_product_df)
+def write_completion_marker(checkpoint_dir, stage_name, input_version, rows=None):
+    '''
+    This function records that a stage finished for the given input version.
 
-    # Clean the rest of the dataframe
-    cleaned_product_df = clean_product_data.clean_products_data(product_weight_kg_df)
+    Args:
+        checkpoint_dir (str): The directory the checkpoints are written to.
+        stage_name (str): The name of the stage.
+        input_version (str): The input version the stage finished for.
+        rows (int): The number of rows the stage uploaded, if it is a table stage.
+    '''
+    marker = {"stage": stage_name, "input_version": input_version, "rows": rows, "completed_at": datetime.now().isoformat()}
+    marker_path = os.path.join(checkpoint_dir, f"{stage_name}.done")
+    # write then rename so a crash never leaves a half written marker
+    with open(marker_path + ".tmp", 'w') as marker_file:
+        json.dump(marker, marker_file)
+    os.replace(marker_path + ".tmp", marker_path)
+
+def clean_checkpoint_path(checkpoint_dir, stage_name, input_version):
+    '''
+    This function gives the path of the parquet file a table stage saves its cleaned data to for an input version.
 
-    # upload to sales_data database using upload_to_db method in a table named dim_products
-    database_connector.upload_to_db(cleaned_product_df, "dim_products", 'db_local_creds.yaml')
+    Args:
+        checkpoint_dir (str): The directory the checkpoints are written to.
+        stage_name (str): The name of the table stage.
+        input_version (str): The input version of the stage.
 
-    return cleaned_product_df
+    Returns:
+        str: The path of the parquet file.
+    '''
+    return os.path.join(checkpoint_dir, f"{stage_name}-{input_version[:16]}.parquet")
 
-def orders_data():
+def prefetch_network_sources(stage_names, config, force=()):
     '''
-    This function retrieves, cleans, and uploads orders data from an AWS RDS into a new table in the sales_data database.
+    This function extracts the API, S3 and PDF sources of several table stages concurrently, on one event loop under one per-host limit.
+
+    Stages that will be skipped as already completed, or resumed from their cleaned data, are left out. If fewer than two
+    sources are left there is nothing to overlap, and each stage extracts its own source.
+
+    Args:
+        stage_names (list): The names of the table stages with a network source.
+        config (dict): The pipeline definition.
+        force (list): The names of the stages to run from scratch, ignoring their checkpoints.
 
     Returns:
-        pandas.DataFrame: A cleaned DataFrame containing orders data, which has also been uploaded to the "orders_table" table.
+        dict: A dictionary mapping each prefetched stage to a tuple of its input version (None without a checkpoint_dir)
+        and its extracted DataFrame, or the exception its extraction raised.
     '''
-    # get table name associated with orders 
-    orders_table_name = get_table_names[2]
+    from data_extraction import DataExtractor
 
-    # create instance of DataExtractor class 
-    extract_rds_data = DataExtractor()
-    rds_orders_df = extract_rds_data.read_rds_table(database_connector, orders_table_name, engine)
+    database_connector = DatabaseConnector()
+    extractor = DataExtractor(**config.get("extraction", {}), use_arrow=config.get("use_arrow", False))
+    checkpoint_dir = config.get("checkpoint_dir")
+
+    input_versions = {}
+    sources = {}
+    for stage_name in stage_names:
+        source = dict(config["tables"][stage_name]["source"])
+        input_version = None
+        if checkpoint_dir:
+            input_version = table_input_version(config["tables"][stage_name], config, database_connector, extractor)
+            marker = read_completion_marker(checkpoint_dir, stage_name)
+            completed = marker and marker["input_version"] == input_version
+            if stage_name not in force and (completed or os.path.exists(clean_checkpoint_path(checkpoint_dir, stage_name, input_version))):
+                continue
+        if source["type"] == "s3":
+            source["address"] = s3_address(source, database_connector)
+        input_versions[stage_name] = input_version
+        sources[stage_name] = source
+    if len(sources) < 2:
+        return {}
+
+    api_header_details = database_connector.read_db_creds(config["api_key"]) if any(source["type"] == "api" for source in sources.values()) else None
+    try:
+        raw_dfs = extractor.extract_sources(sources, api_header_details, return_exceptions=True)
+    except Exception as e:
+        # the time budget ran out, so none of the sources finished
+        raw_dfs = {stage_name: e for stage_name in sources}
 
-    # use it to clean the df and return clean df
-    clean_orders_df = DatabaseCleaning()
-    orders_df = clean_orders_df.clean_orders_data(rds_orders_df)
+    return {stage_name: (input_versions[stage_name], raw_dfs[stage_name]) for stage_name in sources}
 
-    # Upload to sales_data database using upload_to_db method in a table named orders_table
-    database_connector.upload_to_db(orders_df, "orders_table", 'db_local_creds.yaml')
+def run_table_stage(stage_name, config, force=False, input_version=None, raw_df=None):
+    '''
+    This function retrieves, cleans, and uploads the data of one table stage.
+
+    It only depends on its arguments, so it can run in a worker process or be re-run on its own after a failure.
+    If the pipeline definition has a checkpoint_dir, the cleaned data is saved there as a parquet file and a completion
+    marker is written once it is uploaded, both keyed by the input version. A stage that already finished for the same
+    input version is skipped, and one that failed while uploading reuses its cleaned data instead of extracting it again.
 
-    return orders_df
+    Args:
+        stage_name (str): The name of the table stage in the pipeline definition.
+        config (dict): The pipeline definition.
+        force (bool): Whether to run the stage from scratch, ignoring its checkpoints.
+        input_version (str): The input version of the stage, if it was already worked out, or None to work it out here.
+        raw_df (pandas.DataFrame): The extracted data, if it was prefetched, or None to extract it here.
 
-def date_data():
+    Returns:
+        tuple: The number of rows in the table and whether the stage was skipped as already completed.
+    '''
+    import pandas as pd
+    from data_cleaning import DatabaseCleaning
+    from data_extraction import DataExtractor
+
+    table_config = config["tables"][stage_name]
+    use_arrow = config.get("use_arrow", False)
+
+    database_connector = DatabaseConnector()
+    extractor = DataExtractor(**config.get("extraction", {}), use_arrow=use_arrow)
+
+    checkpoint_dir = config.get("checkpoint_dir")
+    clean_path = None
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        input_version = input_version or table_input_version(table_config, config, database_connector, extractor)
+        marker = read_completion_marker(checkpoint_dir, stage_name)
+        if not force and marker and marker["input_version"] == input_version:
+            print(f"Stage '{stage_name}' already completed, skipping.")
+            return marker["rows"], True
+        clean_path = clean_checkpoint_path(checkpoint_dir, stage_name, input_version)
+
+    if clean_path and not force and os.path.exists(clean_path):
+        # cleaned on an earlier run which failed before finishing the upload
+        print(f"Stage '{stage_name}' resuming from {clean_path}.")
+        clean_df = pd.read_parquet(clean_path, **({"dtype_backend": "pyarrow"} if use_arrow else {}))
+    else:
+        if raw_df is None:
+            raw_df = extract_table(table_config["source"], config, database_connector, extractor)
+
+        # run the cleaning methods in the order they are listed
+        cleaning = DatabaseCleaning(use_arrow=use_arrow)
+        clean_df = raw_df
+        for cleaner in table_config["cleaners"]:
+            clean_df = getattr(cleaning, cleaner)(clean_df)
+
+        if clean_path:
+            # remove the checkpoints of older input versions, then write then rename the new one
+            for old_path in glob.glob(os.path.join(checkpoint_dir, f"{stage_name}-*.parquet")):
+                os.remove(old_path)
+            database_connector.stage_to_parquet(clean_df, clean_path + ".tmp")
+            os.replace(clean_path + ".tmp", clean_path)
+
+    load_table(clean_df, table_config, config, database_connector)
+
+    if checkpoint_dir:
+        write_completion_marker(checkpoint_dir, stage_name, input_version, len(clean_df))
+
+    return len(clean_df), False
+
+def postgres_connection_string(creds_file):
     '''
-    This function retrieves, cleans, and uploads orders data from a JSON file in s3 bucket into a new table in the sales_data database.
+    This function builds a psycopg2 connection string from a YAML credentials file.
+
+    Args:
+        creds_file (str): Path to the YAML file containing the database credentials.
 
     Returns:
-        pandas.DataFrame: A cleaned DataFrame containing date data, which has also been uploaded to the "dim_date_times" table.
+        str: PostgreSQL connection string.
+    '''
+    postgres_creds = DatabaseConnector().read_db_creds(creds_file)
+    return f"host={postgres_creds['HOST']} dbname={postgres_creds['DATABASE']} user={postgres_creds['USER']} password={postgres_creds['PASSWORD']}"
+
+def run_schema_stage(config, force=False):
+    '''
+    This function creates the database schema, casting column datatypes, adding descriptive columns and assigning primary and foreign keys.
+
+    With a checkpoint_dir, the stage is skipped if it already ran on the same schema script after the last upload of every table.
+    The script expects the tables as they were uploaded, so when it runs again, every table it already altered and that was not
+    uploaded since is first reloaded from its cleaned data checkpoint.
+
+    Args:
+        config (dict): The pipeline definition.
+        force (bool): Whether to run the stage even if it already completed.
+    '''
+    checkpoint_dir = config.get("checkpoint_dir")
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        with open(config["schema"], 'r') as sql_file:
+            schema_sql = sql_file.read()
+        # the table markers change each time a table is uploaded again, which undoes the schema
+        table_markers = {stage: read_completion_marker(checkpoint_dir, stage) for stage in config["tables"]}
+        input_version = hash_input_version({"schema": schema_sql, "tables": table_markers})
+        marker = read_completion_marker(checkpoint_dir, "schema")
+        if not force and marker and marker["input_version"] == input_version:
+            print("Stage 'schema' already completed, skipping.")
+            return
+        if marker:
+            altered_stages = [stage for stage, table_marker in table_markers.items()
+                              if table_marker and table_marker["completed_at"] < marker["completed_at"]]
+            reload_table_checkpoints(altered_stages, config)
+
+    if not execute_schema_sql_file(postgres_connection_string(config["target_creds"]), config["schema"]):
+        raise RuntimeError("Stage 'schema' failed, rerun to resume from it.")
+
+    if checkpoint_dir:
+        write_completion_marker(checkpoint_dir, "schema", input_version)
+
+def reload_table_checkpoints(stage_names, config):
+    '''
+    This function uploads the cleaned data checkpoints of table stages again, replacing the tables the schema stage altered.
+
+    The table markers are left as they are, as the tables hold the same data as before.
+
+    Args:
+        stage_names (list): The names of the table stages to reload.
+        config (dict): The pipeline definition.
+    '''
+    import pandas as pd
+
+    checkpoint_dir = config["checkpoint_dir"]
+    database_connector = DatabaseConnector()
+    for stage_name in stage_names:
+        marker = read_completion_marker(checkpoint_dir, stage_name)
+        clean_path = clean_checkpoint_path(checkpoint_dir, stage_name, marker["input_version"])
+        if not os.path.exists(clean_path):
+            raise RuntimeError(f"Stage 'schema' needs table '{stage_name}' uploaded again, but {clean_path} is missing; "
+                               f"rerun with --force {stage_name}.")
+        print(f"Reloading '{stage_name}' from {clean_path} before the schema runs again.")
+        clean_df = pd.read_parquet(clean_path, **({"dtype_backend": "pyarrow"} if config.get("use_arrow", False) else {}))
+        load_table(clean_df, config["tables"][stage_name], config, database_connector)
+
+def run_query_stage(config):
     '''
-    # create a DataExtractor instance
-    extract_json_data = DataExtractor()
+    This function answers the business questions about sales and, if configured, shows the store type pie chart.
 
-    # Use read_db_creds method to get link to json object
-    json_s3_address = database_connector.read_db_creds('json_s3_url.yaml')
+    Args:
+        config (dict): The pipeline definition.
+    '''
+    execute_query_sql_file(postgres_connection_string(config["target_creds"]), config["queries"])
 
-    # use extract_from_s3 method to get a dataframe
-    date_time_details_df = extract_json_data.extract_from_s3(json_s3_address)
+    # Here's a visual representation of the result of queary 5: What percentage of sales come through each type of store?
+    if config.get("show_piechart", False):
+        storetype_sales_piechart()
 
-    # Clean the data using clean_date_data 
-    date_cleaning = DatabaseCleaning()
-    clean_date_df = date_cleaning.clean_date_data(date_time_details_df)
+def run_pipeline(config, stages=None, workers=1, force=()):
+    '''
+    This function runs the selected stages: the table stages first, then the schema and then the queries.
 
-    # Upload to sales_data database using upload_to_db method in a table named dim_date_times
-    database_connector.upload_to_db(clean_date_df, "dim_date_times", 'db_local_creds.yaml')
+    A failed table stage doesn't stop the other table stages, but the schema and queries only run once they all succeed.
 
-    return clean_date_df
+    Args:
+        config (dict): The pipeline definition.
+        stages (list): The names of the stages to run, or None to run them all.
+        workers (int): The number of worker processes to run the table stages in.
+        force (list): The names of the stages to run from scratch, ignoring their checkpoints, or ["all"].
+
+    Returns:
+        dict: A dictionary mapping each table stage that uploaded its table to the number of rows it uploaded.
+    '''
+    all_stages = list(config["tables"]) + SQL_STAGES
+    stages = all_stages if not stages else stages
+    force = all_stages if "all" in force else force
+    unknown_stages = [stage for stage in list(stages) + list(force) if stage not in all_stages]
+    if unknown_stages:
+        raise ValueError(f"Unknown stages {unknown_stages}, choose from {all_stages}")
+
+    table_stages = [stage for stage in all_stages if stage in stages and stage in config["tables"]]
+    stage_results = {}
+    failed_stages = {}
+    if workers > 1 and len(table_stages) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {stage: executor.submit(run_table_stage, stage, config, stage in force) for stage in table_stages}
+            for stage, future in futures.items():
+                try:
+                    stage_results[stage] = future.result()
+                except Exception as e:
+                    failed_stages[stage] = e
+    else:
+        # run one after another, the network sources are downloaded together first
+        network_stages = [stage for stage in table_stages if config["tables"][stage]["source"]["type"] in NETWORK_SOURCES]
+        prefetched = prefetch_network_sources(network_stages, config, force) if len(network_stages) > 1 else {}
+        for stage in table_stages:
+            try:
+                input_version, raw_df = prefetched.get(stage, (None, None))
+                if isinstance(raw_df, Exception):
+                    raise raw_df
+                stage_results[stage] = run_table_stage(stage, config, stage in force, input_version, raw_df)
+            except Exception as e:
+                failed_stages[stage] = e
+    rows_uploaded = {}
+    for stage, (rows, skipped) in stage_results.items():
+        if skipped:
+            print(f"Stage '{stage}' skipped, already completed with {rows} rows.")
+        else:
+            print(f"Stage '{stage}' uploaded {rows} rows.")
+            rows_uploaded[stage] = rows
+    for stage, e in failed_stages.items():
+        print(f"Stage '{stage}' failed: {e}")
+    if failed_stages:
+        raise RuntimeError(f"Stages {list(failed_stages)} failed, rerun to resume from them.")
+
+    if "schema" in stages:
+        run_schema_stage(config, "schema" in force)
+    if "queries" in stages:
+        run_query_stage(config)
+
+    return rows_uploaded
 
 def execute_schema_sql_file(creds, file_path):
     '''
@@ -163,8 +489,10 @@ def execute_schema_sql_file(creds, file_path):
         file_path (str): Path to the SQL script file.
 
     Returns:
-        None
+        bool: True if the script ran and was committed, False if it failed and was rolled back.
     '''
+    import psycopg2
+
     with open(file_path, 'r') as sql_file:
         sql_script = sql_file.read()
     conn = psycopg2.connect(creds)
@@ -177,9 +505,11 @@ def execute_schema_sql_file(creds, file_path):
         # Commit the changes
         conn.commit()
         print("SQL script 'create_schema' executed successfully.")
+        return True
 
     except Exception as e:
         print(f"Error executing 'create_schema' SQL script: {e}")
+        return False
 
     finally:
         # Close the cursor and connection
@@ -198,6 +528,8 @@ def execute_query_sql_file(creds, file_path):
         None
     
     '''
+    import psycopg2
+
     # Open the SQL file to read mode
     with open(file_path, 'r') as sql_file:
         sql_script = sql_file.read()
@@ -256,6 +588,9 @@ def storetype_sales_piechart():
     Returns:
         None
     '''
+    import numpy as np
+    import matplotlib.pyplot as plt
+
     fig = plt.figure()
     # Add figure axes
     ax = fig.add_axes([0,0,1,1])
@@ -272,64 +607,64 @@ def storetype_sales_piechart():
     plt.show()
 
 
-if __name__ == "__main__":
-    ### 1. Creating a connection to the AWS database
+def build_parser():
+    '''
+    This function builds the command line argument parser.
 
-    # Create an instance of DatabaseConnector class
-    database_connector = DatabaseConnector()
-    # Use read_db_creds mehtod to return yaml credentials in useable format
-    yaml_creds = database_connector.read_db_creds('db_creds.yaml')
-    # Use these credentials to create an SQLAlchemy database engire to connect to the RDS
-    engine = database_connector.init_db_engine('db_creds.yaml')
-    # List the table names that are in the AWS RDS database
-    get_table_names = database_connector.list_db_tables('db_creds.yaml')
-    #print(get_table_names) # ['legacy_store_details', 'legacy_users', 'orders_table']
-
-    ### 2. Retrive, clean and upload the user data from an AWS database in the cloud.
-    user_data()
-    ### 3. Retrive, clean and upload the card data from a PDF document in an AWS S3 bucket
-    card_data()
-    ### 4. Extract, clean and upload store details using an API
-    '''The store data can be retrieved through the use of an API.
-    The API has two GET methods. One will return the number of stores in the business and the other to retrieve a store given a store number.
-
-    The two endpoints for the API are as follows:
-    Retrieve a store: https://aqj7u5id95.execute-api.eu-west-1.amazonaws.com/prod/store_details/{store_number}
-    Return the number of stores: https://aqj7u5id95.execute-api.eu-west-1.amazonaws.com/prod/number_stores'''
-    # Use read_db_creds method to read yaml file with api key
-    api_header_details = database_connector.read_db_creds('api_key.yaml')
-    num_of_stores_endpoint = "https://aqj7u5id95.execute-api.eu-west-1.amazonaws.com/prod/number_stores"
-    api_retrieval = DataExtractor()
-    # Use the list_number_of_stores method to get the number of total stores
-    total_stores = api_retrieval.list_number_of_stores(num_of_stores_endpoint, api_header_details)
-    #print(total_stores) # 451
-    stores_data()
-    ### 5. Extract, edit, clean and upload data from product details from csv file in s3 bucket
-    product_data()
-    ### 6. Retrieve orders table from AWS RDS
-    orders_data()
-    ### 7. Retrieve, clean and upload date events data from JSON file in s3 bucket.
-    date_data()   
-
-    ### 8. Create the Database Schema
-    # This will be run using the create_schema.sql file and includes casting column datatypes, adding descriptive columns, assigning primary and foreign keys.
-
-    # Create connection to postgresql
-    postgres_creds = database_connector.read_db_creds('db_local_creds.yaml')
-    connection_str = f"host={postgres_creds['HOST']} dbname={postgres_creds['DATABASE']} user={postgres_creds['USER']} password={postgres_creds['PASSWORD']}"
-
-    # Specify SQL file
-    schema_sql_file_path = 'sql_files/essential_queries/create_schema.sql'
-    # Run function to create the schema
-    execute_schema_sql_file(connection_str, schema_sql_file_path)
-
-    ### 9. Query the Database  
-    # Answering business questions about sales 
-
-    # Specify SQL file
-    query_sql_file_path = 'sql_files/essential_queries/business_queries_copy.sql'
-    # Run function to query the database
-    execute_query_sql_file(connection_str, query_sql_file_path)
+    Returns:
+        argparse.ArgumentParser: The argument parser.
+    '''
+    parser = argparse.ArgumentParser(description="Retrieve, clean and upload the retail data to the sales_data database, then create the schema and query it.")
+    parser.add_argument("stages", nargs="*", help="the stages to run, e.g. dim_users orders_table schema queries (default: all)")
+    parser.add_argument("--config", default="pipeline_config.yaml", help="path to the pipeline definition")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes for the table stages")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE", help="run STAGE from scratch, ignoring its checkpoints (repeatable, or 'all')")
+    parser.add_argument("--list", action="store_true", help="list the stages in the pipeline definition and exit")
+    return parser
+
+def parse_args(argv=None):
+    '''
+    This function parses the command line arguments.
 
-    # Here's a visual representation of the result of queary 5: What percentage of sales come through each type of store?
-    storetype_sales_piechart()
+    Args:
+        argv (list): The arguments to parse, or None to use sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    '''
+    return build_parser().parse_args(argv)
+
+def main(argv=None):
+    '''
+    This function is the command line entry point of the pipeline.
+
+    Mistakes in the arguments, such as an unknown stage name, are reported as usage errors before anything runs.
+
+    Args:
+        argv (list): The arguments to parse, or None to use sys.argv.
+    '''
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error(f"--workers must be at least 1, got {args.workers}")
+    try:
+        config = load_pipeline_config(args.config)
+    except FileNotFoundError:
+        parser.error(f"pipeline definition {args.config!r} not found")
+
+    all_stages = list(config["tables"]) + SQL_STAGES
+    if args.list:
+        print("\n".join(all_stages))
+        return
+
+    unknown_stages = [stage for stage in args.stages if stage not in all_stages]
+    if unknown_stages:
+        parser.error(f"unknown stage(s) {', '.join(unknown_stages)}; choose from {', '.join(all_stages)}")
+    unknown_forced = [stage for stage in args.force if stage not in all_stages + ["all"]]
+    if unknown_forced:
+        parser.error(f"unknown --force stage(s) {', '.join(unknown_forced)}; choose from {', '.join(all_stages)} or all")
+
+    run_pipeline(config, args.stages, args.workers, args.force)
+
+if __name__ == "__main__":
+    main()
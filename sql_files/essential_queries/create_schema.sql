@@ -2,11 +2,11 @@ ALTER TABLE orders_table
 DROP COLUMN level_0,
 DROP COLUMN index;
 
+-- store_code is the partition key of orders_table, so its type can't be altered
 ALTER TABLE orders_table
 ALTER COLUMN date_uuid TYPE UUID USING date_uuid::uuid,
 ALTER COLUMN user_uuid TYPE UUID USING user_uuid::uuid,
 ALTER COLUMN card_number TYPE VARCHAR(19),
-ALTER COLUMN store_code TYPE VARCHAR(12),
 ALTER COLUMN product_code TYPE VARCHAR(11),
 ALTER COLUMN product_quantity TYPE SMALLINT;
 
@@ -51,7 +51,13 @@ ALTER TABLE dim_products
 RENAME COLUMN removed TO still_available;
 
 ALTER TABLE dim_products
-ALTER COLUMN product_price_sterling TYPE FLOAT,
+ADD COLUMN product_price_sterling NUMERIC(10, 2);
+
+UPDATE dim_products
+SET product_price_sterling = product_price_pence / 100.0;
+
+ALTER TABLE dim_products
+ALTER COLUMN product_price_pence TYPE INTEGER,
 ALTER COLUMN weight_kg TYPE FLOAT,
 ALTER COLUMN "EAN" TYPE VARCHAR(17),
 ALTER COLUMN product_code TYPE VARCHAR(11),
@@ -0,0 +1,141 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+# the modules live in the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PDF_BYTES = b"%PDF-1.4 stub card details"
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    '''
+    This class serves stand-ins for the store API and the card details PDF, recording when each request arrived.
+    '''
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.request_times.append(time.monotonic())
+            server.request_paths.append(self.path)
+        try:
+            self._respond()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def do_HEAD(self):
+        if self.path == "/card_details.pdf":
+            self.send_response(200)
+            self.send_header("ETag", '"card-details-v1"')
+            self.send_header("Content-Length", str(len(PDF_BYTES)))
+        else:
+            self.send_response(404)
+        self.end_headers()
+
+    def _respond(self):
+        store_match = re.fullmatch(r"/prod/store_details/(\d+)", self.path)
+        if self.headers.get("x-api-key") != "key" and self.path.startswith("/prod/"):
+            self._send(403, json.dumps({"message": "Forbidden"}).encode())
+        elif self.path == "/prod/number_stores":
+            self._send(200, json.dumps({"statusCode": 200, "number_stores": self.server.number_stores}).encode())
+        elif store_match:
+            store_number = int(store_match.group(1))
+            # later stores answer first, so the results only come back in order if the extractor keeps them in order
+            time.sleep(self.server.delay * (self.server.number_stores - store_number))
+            self._send(200, json.dumps({"index": store_number, "store_code": f"ST-{store_number}"}).encode())
+        elif self.path == "/card_details.pdf":
+            self._send(200, PDF_BYTES)
+        elif self.path == "/slow":
+            time.sleep(5)
+            self._send(200, b"{}")
+        else:
+            self._send(404, b"{}")
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api():
+    '''
+    This fixture runs the stub API on a free local port for the length of a test.
+    '''
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubApiHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.request_times = []
+    server.request_paths = []
+    server.number_stores = 12
+    server.delay = 0.01
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class StubS3Client:
+    def __init__(self, objects):
+        self.objects = objects
+        self.requested = []
+
+    def get_object(self, Bucket, Key):
+        self.requested.append((Bucket, Key))
+        return {"Body": types.SimpleNamespace(read=lambda: self.objects[(Bucket, Key)])}
+
+
+@pytest.fixture
+def stub_s3(monkeypatch):
+    '''
+    This fixture replaces boto3 and botocore with stand-ins serving two objects from memory.
+    '''
+    s3_client = StubS3Client({
+        ("bucket", "products.csv"): b",product_name,product_price\n0,Tea,\xc2\xa31.99\n1,Milk,\xc2\xa30.65\n",
+        ("bucket", "date_details.json"): b'{"time_period": {"0": "Evening", "1": "Morning"}, "month": {"0": "9", "1": "2"}}',
+    })
+    client_configs = []
+
+    def client(service_name, config=None):
+        assert service_name == "s3"
+        client_configs.append(config)
+        return s3_client
+
+    botocore_config = types.ModuleType("botocore.config")
+    botocore_config.Config = lambda **kwargs: kwargs
+    monkeypatch.setitem(sys.modules, "boto3", types.SimpleNamespace(client=client))
+    monkeypatch.setitem(sys.modules, "botocore", types.ModuleType("botocore"))
+    monkeypatch.setitem(sys.modules, "botocore.config", botocore_config)
+    s3_client.client_configs = client_configs
+    return s3_client
+
+
+@pytest.fixture
+def stub_tabula(monkeypatch):
+    '''
+    This fixture replaces tabula, which needs a JVM, with a stand-in that reads the stub PDF as one table.
+    '''
+    def read_pdf(pdf_file, pages):
+        assert pdf_file.read() == PDF_BYTES
+        return [pd.DataFrame({"card_number": ["4971858637664481"], "card_provider": ["VISA 16 digit"]})]
+
+    monkeypatch.setitem(sys.modules, "tabula", types.SimpleNamespace(read_pdf=read_pdf))
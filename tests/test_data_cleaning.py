@@ -0,0 +1,118 @@
+import os
+
+import pandas as pd
+import pytest
+
+import main
+from data_cleaning import DatabaseCleaning
+
+CONFIG = main.load_pipeline_config(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline_config.yaml"))
+
+# a few rows of each source, shaped like the extracted data, with a row each cleaner should drop
+RAW_TABLES = {
+    "dim_users": pd.DataFrame({
+        "index": [0, 1, 2],
+        "first_name": ["Sigfried", "Guy", "NULL"],
+        "last_name": ["Noack", "Allen", "NULL"],
+        "date_of_birth": ["1990-09-30", "1940 December 01", "NULL"],
+        "company": ["Heber Ltd", "Fox Ltd", "NULL"],
+        "email_address": ["rudi79@winkler.de", "rhodesclifford@henderson.com", "NULL"],
+        "address": ["Zimmerstr. 1/0\n59015 Gießen", "Studio 22a\nLake Janemouth", "NULL"],
+        "country": ["Germany", "United Kingdom", "NULL"],
+        "country_code": ["DE", "GB", "NULL"],
+        "phone_number": ["+49(0) 047905356", "(0161) 496 0674", "NULL"],
+        "join_date": ["2018-10-10", "2001 December 20", "NULL"],
+        "user_uuid": ["93caf182-e4e9-4c6e-bebb-60a1a9dcf9b8", "8fe96c3a-d62d-4eb5-b313-cf12d9126a49", "NULL"],
+    }),
+    "dim_card_details": pd.DataFrame({
+        "card_number": ["30060773296197", "??4971858637664481", "NULL"],
+        "expiry_date": ["09/26", "10/23", "NULL"],
+        "card_provider": ["Diners Club / Carte Blanche", "VISA 16 digit", "NULL"],
+        "date_payment_confirmed": ["2015-11-25", "2001 June 18", "NULL"],
+    }),
+    "dim_store_details": pd.DataFrame({
+        "index": [0, 1, 2, 3],
+        "address": ["N/A", "Flat 72W\nSally isle\nEast Deantown\nE7B 8EB", "Heckerstraße 4/5\n50491 Säckingen", "NULL"],
+        "longitude": ["N/A", "51.62907", "6.4", "NULL"],
+        "lat": [None, None, None, None],
+        "locality": ["N/A", "High Wycombe", "Möckmühl", "NULL"],
+        "store_code": ["WEB-1388012W", "HI-9B97EE4E", "MO-FE4E6B0B", "NULL"],
+        "staff_numbers": ["325", "34", "J78", "NULL"],
+        "opening_date": ["2010-06-12", "1996-10-25", "2006 October 04", "NULL"],
+        "store_type": ["Web Portal", "Local", "Super Store", "NULL"],
+        "latitude": ["N/A", "-0.74934", "50.1", "NULL"],
+        "country_code": ["GB", "GB", "DE", "NULL"],
+        "continent": ["Europe", "Europe", "eeEurope", "NULL"],
+    }),
+    "dim_products": pd.DataFrame({
+        "Unnamed: 0": [0, 1, 2, 3],
+        "product_name": ["FurReal Dazzlin' Dimples My Playful Dolphin", "Tiffany's World Day Of The Week Charm", "Glade Plug-In", "NULL"],
+        "product_price": ["£39.99", "£12.99", "£1,299.99", "NULL"],
+        "weight": ["1.6kg", "77g", "12 x 100g", "NULL"],
+        "category": ["toys-and-games", "toys-and-games", "homeware", "NULL"],
+        "EAN": ["7425710935115", "487128731892", "3156373567009", "NULL"],
+        "date_added": ["2005-12-02", "2006 September 27", "2016-02-13", "NULL"],
+        "uuid": ["83dc0a69-f96f-4c34-bcb7-928acae19a94", "712254d7-aea7-4310-aff8-8bcdd0aec7ff", "a2a22ab8-9bba-4c17-b7c3-b8b5b3b6b5ad", "NULL"],
+        "removed": ["Still_avaliable", "Removed", "Still_avaliable", "NULL"],
+        "product_code": ["R7-3126933h", "C2-7287916l", "h0-3284216U", "NULL"],
+    }),
+    "orders_table": pd.DataFrame({
+        "level_0": [0, 1],
+        "index": [0, 1],
+        "date_uuid": ["9476f17e-5d6a-4117-874d-9cdb38ca1fa6", "0423a395-a04d-4e4a-bd0f-d237cbd5a295"],
+        "first_name": [None, None],
+        "last_name": [None, None],
+        "user_uuid": ["93caf182-e4e9-4c6e-bebb-60a1a9dcf9b8", "8fe96c3a-d62d-4eb5-b313-cf12d9126a49"],
+        "card_number": [30060773296197, 4971858637664481],
+        "store_code": ["BL-8387506C", "WEB-1388012W"],
+        "product_code": ["R7-3126933h", "C2-7287916l"],
+        "1": [None, None],
+        "product_quantity": [3, 4],
+    }),
+    "dim_date_times": pd.DataFrame({
+        "timestamp": ["22:00:06", "22:44:06", "NULL"],
+        "month": ["9", "2", "NULL"],
+        "year": ["2012", "1997", "NULL"],
+        "day": ["19", "10", "NULL"],
+        "time_period": ["Evening", "Late_Hours", "NULL"],
+        "date_uuid": ["3b7ca996-37f9-433f-b6d0-ce8391b615ad", "adc86836-6c35-49ca-bb0d-65b6507a00fa", "NULL"],
+    }),
+}
+
+
+def extracted(stage_name, use_arrow):
+    # the Arrow extraction hands the cleaners Arrow-backed columns, as read_csv/read_sql_table(dtype_backend="pyarrow") do
+    raw_df = RAW_TABLES[stage_name].copy()
+    return raw_df.convert_dtypes(dtype_backend="pyarrow") if use_arrow else raw_df
+
+
+def clean(stage_name, use_arrow):
+    cleaning = DatabaseCleaning(use_arrow=use_arrow)
+    clean_df = extracted(stage_name, use_arrow)
+    for cleaner in CONFIG["tables"][stage_name]["cleaners"]:
+        clean_df = getattr(cleaning, cleaner)(clean_df)
+    return clean_df
+
+
+def test_every_table_stage_has_sample_data():
+    assert set(RAW_TABLES) == set(CONFIG["tables"])
+
+
+@pytest.mark.filterwarnings("ignore")
+@pytest.mark.parametrize("stage_name", list(RAW_TABLES))
+def test_cleaners_give_the_same_rows_on_arrow_input(stage_name):
+    object_df = clean(stage_name, use_arrow=False)
+    arrow_df = clean(stage_name, use_arrow=True)
+
+    assert list(arrow_df.columns) == list(object_df.columns)
+    # compare values as strings, as the two paths are meant to differ in dtypes only
+    pd.testing.assert_frame_equal(arrow_df.astype(str).reset_index(drop=True), object_df.astype(str).reset_index(drop=True))
+    string_columns = [column for column, dtype in object_df.dtypes.items() if dtype == "string"]
+    assert string_columns and all(isinstance(arrow_df[column].dtype, pd.ArrowDtype) for column in string_columns)
+
+
+@pytest.mark.filterwarnings("ignore")
+def test_convert_product_weights_on_arrow_strings():
+    products_df = DatabaseCleaning(use_arrow=True).convert_product_weights(extracted("dim_products", use_arrow=True))
+
+    assert products_df["weight_kg"].tolist()[:2] == [1.6, 0.077]
@@ -0,0 +1,207 @@
+import asyncio
+import sys
+import time
+import types
+
+import aiohttp
+import pandas as pd
+import pytest
+
+from conftest import PDF_BYTES
+from data_extraction import AsyncDataExtractor, DataExtractor, HostRateLimiter
+
+HEADER = {"x-api-key": "key"}
+
+
+def test_list_number_of_stores(stub_api):
+    extractor = DataExtractor()
+
+    assert extractor.list_number_of_stores(f"{stub_api.url}/prod/number_stores", HEADER) == 12
+
+
+def test_retrieve_stores_data_keeps_store_order(stub_api):
+    extractor = DataExtractor()
+
+    stores_df = extractor.retrieve_stores_data(f"{stub_api.url}/prod/store_details/", 12, HEADER)
+
+    assert stores_df["index"].tolist() == list(range(12))
+    assert stores_df["store_code"].tolist() == [f"ST-{n}" for n in range(12)]
+
+
+def test_retrieve_stores_data_limits_concurrency_per_host(stub_api):
+    extractor = DataExtractor(max_concurrent_requests=3)
+
+    extractor.retrieve_stores_data(f"{stub_api.url}/prod/store_details/", 12, HEADER)
+
+    assert stub_api.max_in_flight == 3
+
+
+def test_retrieve_stores_data_spaces_requests(stub_api):
+    stub_api.delay = 0
+    extractor = DataExtractor(requests_per_second=50)
+
+    extractor.retrieve_stores_data(f"{stub_api.url}/prod/store_details/", 12, HEADER)
+
+    times = stub_api.request_times
+    # 12 requests at 50 per second take at least 11 gaps of 20ms, with a little slack for the clocks
+    assert times[-1] - times[0] >= 11 * 0.02 - 0.01
+
+
+def test_error_responses_raise_instead_of_becoming_rows(stub_api):
+    extractor = DataExtractor()
+
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        extractor.retrieve_stores_data(f"{stub_api.url}/prod/store_details/", 3, {"x-api-key": "wrong"})
+
+    assert error.value.status == 403
+
+
+def test_http_request_is_cut_off_at_the_timeout(stub_api):
+    extractor = AsyncDataExtractor(timeout=0.5)
+
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        extractor.run(_get_slow(extractor, stub_api))
+
+    assert time.monotonic() - start < 2
+
+
+async def _get_slow(extractor, stub_api):
+    async with extractor._session_scope(None) as session:
+        return await extractor._get(session, f"{stub_api.url}/slow")
+
+
+def test_blocking_work_is_cut_off_at_the_timeout():
+    extractor = AsyncDataExtractor(timeout=0.5)
+
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        extractor.run(extractor._in_thread(time.sleep, 3))
+
+    # run() must not wait for the worker thread to finish its sleep
+    assert time.monotonic() - start < 2
+
+
+def test_host_rate_limiter_limits_each_host_separately():
+    limiter = HostRateLimiter(max_concurrent_requests=2)
+    in_flight = {"a": 0, "b": 0}
+    max_in_flight = {"a": 0, "b": 0}
+
+    async def request(host):
+        async with limiter.limit(host):
+            in_flight[host] += 1
+            max_in_flight[host] = max(max_in_flight[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+
+    async def requests():
+        await asyncio.gather(*(request(host) for host in "ab" * 10))
+
+    asyncio.run(requests())
+
+    assert max_in_flight == {"a": 2, "b": 2}
+
+
+def test_host_rate_limiter_spaces_requests():
+    limiter = HostRateLimiter(max_concurrent_requests=10, requests_per_second=20)
+    request_times = []
+
+    async def request():
+        async with limiter.limit("host"):
+            request_times.append(asyncio.get_running_loop().time())
+
+    async def requests():
+        await asyncio.gather(*(request() for _ in range(5)))
+
+    asyncio.run(requests())
+
+    gaps = [later - earlier for earlier, later in zip(request_times, request_times[1:])]
+    assert all(gap >= 0.05 - 0.005 for gap in gaps)
+
+
+def test_retrieve_pdf_data(stub_api, monkeypatch):
+    read_pdf_calls = []
+
+    def read_pdf(pdf_file, pages):
+        read_pdf_calls.append((pdf_file.read(), pages))
+        return [pd.DataFrame({"card_number": ["4971858637664481"]}), pd.DataFrame({"card_number": ["30060773296197"]})]
+
+    monkeypatch.setitem(sys.modules, "tabula", types.SimpleNamespace(read_pdf=read_pdf))
+    extractor = DataExtractor()
+
+    pdf_df = extractor.retrieve_pdf_data(f"{stub_api.url}/card_details.pdf")
+
+    assert read_pdf_calls == [(PDF_BYTES, "all")]
+    assert pdf_df["card_number"].tolist() == ["4971858637664481", "30060773296197"]
+
+
+def test_pdf_version_is_read_from_the_headers(stub_api):
+    extractor = DataExtractor()
+
+    assert extractor.pdf_version(f"{stub_api.url}/card_details.pdf") == '"card-details-v1"'
+    # a HEAD request, so the PDF isn't downloaded
+    assert len(stub_api.request_times) == 0
+
+
+def test_extract_from_s3_csv(stub_s3):
+    extractor = DataExtractor(timeout=30)
+
+    products_df = extractor.extract_from_s3("s3://bucket/products.csv")
+
+    assert stub_s3.requested == [("bucket", "products.csv")]
+    assert products_df["product_name"].tolist() == ["Tea", "Milk"]
+    assert products_df["product_price"].tolist() == ["£1.99", "£0.65"]
+    # boto3 gets socket timeouts too, as the budget can't interrupt a blocked download
+    assert stub_s3.client_configs == [{"connect_timeout": 30, "read_timeout": 30}]
+
+
+def test_extract_from_s3_json_with_arrow(stub_s3):
+    extractor = DataExtractor(use_arrow=True)
+
+    dates_df = extractor.extract_from_s3("s3://bucket/date_details.json")
+
+    assert dates_df["time_period"].tolist() == ["Evening", "Morning"]
+    assert isinstance(dates_df["time_period"].dtype, pd.ArrowDtype)
+
+
+def test_extract_sources_downloads_every_source_together(stub_api, stub_s3, stub_tabula):
+    extractor = DataExtractor(max_concurrent_requests=4)
+    sources = {
+        "dim_store_details": {"type": "api", "number_stores_endpoint": f"{stub_api.url}/prod/number_stores", "store_endpoint": f"{stub_api.url}/prod/store_details/"},
+        "dim_card_details": {"type": "pdf", "link": f"{stub_api.url}/card_details.pdf"},
+        "dim_products": {"type": "s3", "address": "s3://bucket/products.csv"},
+    }
+
+    raw_dfs = extractor.extract_sources(sources, HEADER)
+
+    assert list(raw_dfs) == list(sources)
+    assert raw_dfs["dim_store_details"]["index"].tolist() == list(range(12))
+    assert raw_dfs["dim_card_details"]["card_number"].tolist() == ["4971858637664481"]
+    assert raw_dfs["dim_products"]["product_name"].tolist() == ["Tea", "Milk"]
+    # the PDF was downloaded while the store requests were still going, and all of them shared one per-host limit
+    paths = stub_api.request_paths
+    assert paths.index("/card_details.pdf") < paths.index("/prod/store_details/11")
+    assert stub_api.max_in_flight == 4
+
+
+def test_extract_sources_can_return_the_exception_of_a_failed_source(stub_api, stub_s3):
+    extractor = DataExtractor()
+    sources = {
+        "dim_store_details": {"type": "api", "number_stores_endpoint": f"{stub_api.url}/prod/number_stores", "store_endpoint": f"{stub_api.url}/prod/store_details/"},
+        "dim_products": {"type": "s3", "address": "s3://bucket/products.csv"},
+    }
+
+    raw_dfs = extractor.extract_sources(sources, {"x-api-key": "wrong"}, return_exceptions=True)
+
+    assert isinstance(raw_dfs["dim_store_details"], aiohttp.ClientResponseError)
+    assert raw_dfs["dim_products"]["product_name"].tolist() == ["Tea", "Milk"]
+
+
+def test_rate_limit_is_shared_by_successive_calls(stub_api):
+    extractor = DataExtractor(requests_per_second=10)
+
+    extractor.list_number_of_stores(f"{stub_api.url}/prod/number_stores", HEADER)
+    extractor.retrieve_stores_data(f"{stub_api.url}/prod/store_details/", 1, HEADER)
+
+    # each call runs on its own event loop, but the second request still waits for the first one's slot
+    assert stub_api.request_times[1] - stub_api.request_times[0] >= 0.1 - 0.01
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from data_normalisation import DataNormaliser
+
+
+def test_normalise_card_numbers_strips_non_digits_and_checks_luhn():
+    card_numbers, luhn_valid = DataNormaliser().normalise_card_numbers(pd.Series(["??4971858637664481", "4971858637664482", "NULL", None]))
+
+    assert card_numbers.tolist() == ["4971858637664481", "4971858637664482", pd.NA, pd.NA]
+    assert luhn_valid.tolist() == [True, False, False, False]
+
+
+@pytest.mark.parametrize("dtype", ["float64", "Float64", pd.ArrowDtype(pa.float64()), object])
+def test_normalise_card_numbers_reads_floats_as_whole_numbers(dtype):
+    card_series = pd.Series([4.971858637664481e15, 30060773296197.0, 1.5, np.nan, 1.2345678901234567e18], dtype=dtype)
+
+    card_numbers, luhn_valid = DataNormaliser().normalise_card_numbers(card_series)
+
+    # no trailing "0" from the ".0", and fractions or floats past 2**53 can't be trusted as card numbers
+    assert card_numbers.tolist() == ["4971858637664481", "30060773296197", pd.NA, pd.NA, pd.NA]
+    assert luhn_valid.tolist() == [True, True, False, False, False]
+
+
+@pytest.mark.parametrize("dtype", ["int64[pyarrow]", "Int64", object])
+def test_normalise_card_numbers_reads_integer_columns_with_nulls(dtype):
+    card_series = pd.Series([4971858637664481, 30060773296197, None], dtype="Int64").astype(dtype)
+
+    card_numbers, luhn_valid = DataNormaliser().normalise_card_numbers(card_series)
+
+    assert card_numbers.tolist() == ["4971858637664481", "30060773296197", pd.NA]
+    assert luhn_valid.tolist() == [True, True, False]
+
+
+def test_normalise_prices_to_pence():
+    pence = DataNormaliser().normalise_prices_to_pence(pd.Series(["£1,299.99", "£9.5", "£0.651", "£1.2.3", "free", None]))
+
+    assert pence.tolist() == [129999, 950, pd.NA, pd.NA, pd.NA, pd.NA]
+
+
+@pytest.mark.parametrize("dtype", ["float64", "Float64", "double[pyarrow]", object])
+def test_normalise_prices_to_pence_scales_numbers(dtype):
+    price_series = pd.Series([0.1 + 0.2, 1.99, 100.0, 1.15, 1e-05, 0.651, -1.0, np.nan], dtype=dtype)
+
+    pence = DataNormaliser().normalise_prices_to_pence(price_series)
+
+    # not read from the repr, which would drop 0.30000000000000004 and 1e-05 as malformed text
+    assert pence.tolist() == [30, 199, 10000, 115, pd.NA, pd.NA, pd.NA, pd.NA]
+
+
+@pytest.mark.parametrize("dtype", ["int64[pyarrow]", "Int64"])
+def test_normalise_prices_to_pence_reads_integer_columns_with_nulls(dtype):
+    pence = DataNormaliser().normalise_prices_to_pence(pd.Series([5, 12, None], dtype=dtype))
+
+    assert pence.tolist() == [500, 1200, pd.NA]
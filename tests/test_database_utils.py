@@ -0,0 +1,67 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from database_utils import DatabaseConnector
+
+
+def bucket(key, partitions):
+    return zlib.crc32(key.encode()) % partitions
+
+
+@pytest.fixture
+def orders_df():
+    rng = np.random.default_rng(0)
+    store_codes = np.array([f"GB-{code:08X}" for code in range(40)] + [None], dtype=object)
+    return pd.DataFrame({
+        "store_code": store_codes[rng.integers(0, len(store_codes), 1000)],
+        "product_quantity": np.arange(1000),
+    })
+
+
+def test_plan_partitions_puts_each_row_in_its_key_bucket(orders_df):
+    plan = DatabaseConnector().plan_partitions(orders_df, "orders_table", "store_code", 8)
+
+    assert sum(partition_table.num_rows for _, partition_table in plan.values()) == len(orders_df)
+    for partition_name, (bucket_keys, partition_table) in plan.items():
+        partition_df = partition_table.to_pandas()
+        if bucket_keys is None:
+            continue
+        number = int(partition_name.rsplit("_p", 1)[1])
+        assert all(bucket(key, 8) == number for key in bucket_keys)
+        assert set(partition_df["store_code"]) == set(bucket_keys)
+        # every row with one of the bucket's keys, in the original order
+        expected_df = orders_df[orders_df["store_code"].isin(bucket_keys)].reset_index(drop=True)
+        pd.testing.assert_frame_equal(partition_df, expected_df)
+
+
+def test_plan_partitions_sends_null_keys_to_the_default_partition(orders_df):
+    plan = DatabaseConnector().plan_partitions(orders_df, "orders_table", "store_code", 8)
+
+    default_keys, default_table = plan["orders_table_default"]
+    assert list(plan)[-1] == "orders_table_default"
+    assert default_keys is None
+    assert default_table.num_rows == orders_df["store_code"].isna().sum() > 0
+    assert default_table.column("store_code").null_count == default_table.num_rows
+
+
+def test_plan_partitions_skips_empty_buckets():
+    # two keys can fill at most two of the eight buckets
+    orders_df = pd.DataFrame({"store_code": ["GB-A", "GB-B", "GB-A"], "product_quantity": [1, 2, 3]})
+
+    plan = DatabaseConnector().plan_partitions(orders_df, "orders_table", "store_code", 8)
+
+    bucket_names = {f"orders_table_p{bucket(key, 8)}" for key in ["GB-A", "GB-B"]}
+    assert set(plan) == bucket_names | {"orders_table_default"}
+    assert all(bucket_keys for bucket_keys, _ in list(plan.values())[:-1])
+    assert plan["orders_table_default"][1].num_rows == 0
+    assert sum(partition_table.num_rows for _, partition_table in plan.values()) == 3
+
+
+def test_plan_partitions_is_stable_across_runs(orders_df):
+    first_plan = DatabaseConnector().plan_partitions(orders_df, "orders_table", "store_code", 8)
+    second_plan = DatabaseConnector().plan_partitions(orders_df.sample(frac=1, random_state=1), "orders_table", "store_code", 8)
+
+    assert {name: sorted(keys) for name, (keys, _) in first_plan.items() if keys} == {name: sorted(keys) for name, (keys, _) in second_plan.items() if keys}
@@ -0,0 +1,252 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+import main
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline_config.yaml")
+
+
+@pytest.mark.parametrize("argv, message", [
+    (["dim_user"], "unknown stage(s) dim_user"),
+    (["--force", "dim_prodcts", "dim_products"], "unknown --force stage(s) dim_prodcts"),
+    (["--workers", "0"], "--workers must be at least 1"),
+    (["--config", "missing.yaml"], "pipeline definition 'missing.yaml' not found"),
+])
+def test_main_reports_bad_arguments_as_usage_errors(argv, message, capsys, monkeypatch):
+    monkeypatch.setattr(main, "run_pipeline", lambda *args: pytest.fail("the pipeline must not run"))
+
+    with pytest.raises(SystemExit) as exit_info:
+        main.main(["--config", CONFIG] + argv)
+
+    assert exit_info.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+def test_main_runs_the_named_stages(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "run_pipeline", lambda *args: calls.append(args))
+
+    main.main(["--config", CONFIG, "dim_users", "schema", "--force", "all", "--workers", "2"])
+
+    (config, stages, workers, force), = calls
+    assert (stages, workers, force) == (["dim_users", "schema"], 2, ["all"])
+
+
+class StubExtractor:
+    def __init__(self, pdf_version):
+        self.version = pdf_version
+
+    def pdf_version(self, link):
+        return self.version
+
+
+def test_table_input_version_follows_the_source_version():
+    table_config = {"source": {"type": "pdf", "link": "https://example.com/card_details.pdf"}, "cleaners": ["clean_card_data"]}
+
+    versions = [main.table_input_version(table_config, {}, None, StubExtractor(pdf_version)) for pdf_version in ["v1", "v1", "v2"]]
+
+    assert versions[0] == versions[1] != versions[2]
+
+
+def test_run_pipeline_reports_skipped_stages(monkeypatch, capsys):
+    config = main.load_pipeline_config(CONFIG)
+    results = {"dim_users": (10, True), "dim_products": (20, False)}
+    monkeypatch.setattr(main, "run_table_stage", lambda stage, config, force, input_version, raw_df: results[stage])
+
+    rows_uploaded = main.run_pipeline(config, ["dim_users", "dim_products"])
+
+    output = capsys.readouterr().out
+    assert "Stage 'dim_users' skipped, already completed with 10 rows." in output
+    assert "Stage 'dim_products' uploaded 20 rows." in output
+    assert rows_uploaded == {"dim_products": 20}
+
+
+def test_run_pipeline_downloads_the_network_sources_together(stub_api, stub_s3, stub_tabula, tmp_path, monkeypatch):
+    api_key = tmp_path / "api_key.yaml"
+    api_key.write_text("x-api-key: key\n")
+    config = {
+        "api_key": str(api_key),
+        "tables": {
+            "dim_users": {"source": {"type": "rds", "table": "legacy_users"}},
+            "dim_card_details": {"source": {"type": "pdf", "link": f"{stub_api.url}/card_details.pdf"}},
+            "dim_store_details": {"source": {"type": "api", "number_stores_endpoint": f"{stub_api.url}/prod/number_stores", "store_endpoint": f"{stub_api.url}/prod/store_details/"}},
+            "dim_products": {"source": {"type": "s3", "address": "s3://bucket/products.csv"}},
+        },
+    }
+    raw_dfs = {}
+
+    def run_table_stage(stage, config, force, input_version, raw_df):
+        raw_dfs[stage] = raw_df
+        return 0, False
+
+    monkeypatch.setattr(main, "run_table_stage", run_table_stage)
+
+    main.run_pipeline(config, list(config["tables"]))
+
+    # the RDS stage reads its own table, the rest were downloaded on one event loop before the stages ran
+    assert raw_dfs["dim_users"] is None
+    assert raw_dfs["dim_card_details"]["card_number"].tolist() == ["4971858637664481"]
+    assert raw_dfs["dim_store_details"]["index"].tolist() == list(range(12))
+    assert raw_dfs["dim_products"]["product_name"].tolist() == ["Tea", "Milk"]
+    assert stub_api.request_paths.index("/card_details.pdf") < stub_api.request_paths.index("/prod/store_details/11")
+
+
+def test_run_pipeline_fails_only_the_stage_whose_download_failed(stub_api, stub_s3, stub_tabula, tmp_path, monkeypatch, capsys):
+    api_key = tmp_path / "api_key.yaml"
+    api_key.write_text("x-api-key: wrong\n")
+    config = {
+        "api_key": str(api_key),
+        "tables": {
+            "dim_store_details": {"source": {"type": "api", "number_stores_endpoint": f"{stub_api.url}/prod/number_stores", "store_endpoint": f"{stub_api.url}/prod/store_details/"}},
+            "dim_products": {"source": {"type": "s3", "address": "s3://bucket/products.csv"}},
+        },
+    }
+    monkeypatch.setattr(main, "run_table_stage", lambda stage, config, force, input_version, raw_df: (len(raw_df), False))
+
+    with pytest.raises(RuntimeError, match="dim_store_details"):
+        main.run_pipeline(config, list(config["tables"]))
+
+    output = capsys.readouterr().out
+    assert "Stage 'dim_products' uploaded 2 rows." in output
+    assert "Stage 'dim_store_details' failed: 403" in output
+
+
+class StubPipeline:
+    '''
+    This class stands in for the sources, the database and the schema script of a pipeline with two RDS tables, recording each upload.
+    '''
+
+    def __init__(self, checkpoint_dir, schema_path):
+        self.source_versions = {"legacy_users": "v1", "orders_table": "v1"}
+        self.extracted = []
+        self.loaded = []
+        self.schema_runs = 0
+        self.failing_loads = set()
+        self.config = {
+            "target_creds": "db_local_creds.yaml",
+            "checkpoint_dir": str(checkpoint_dir),
+            "schema": str(schema_path),
+            "tables": {
+                "dim_users": {"source": {"type": "rds", "table": "legacy_users"}, "target": "dim_users", "cleaners": []},
+                "orders_table": {"source": {"type": "rds", "table": "orders_table"}, "target": "orders_table", "cleaners": []},
+            },
+        }
+
+    def table_input_version(self, table_config, config, database_connector, extractor):
+        return main.hash_input_version({"source": self.source_versions[table_config["source"]["table"]]})
+
+    def extract_table(self, source, config, database_connector, extractor):
+        self.extracted.append(source["table"])
+        return pd.DataFrame({"source": [source["table"]] * 3})
+
+    def load_table(self, clean_df, table_config, config, database_connector):
+        if table_config["target"] in self.failing_loads:
+            raise ConnectionError("connection lost")
+        self.loaded.append(table_config["target"])
+
+    def execute_schema_sql_file(self, creds, file_path):
+        self.schema_runs += 1
+        return True
+
+
+@pytest.fixture
+def stub_pipeline(tmp_path, monkeypatch):
+    schema_path = tmp_path / "create_schema.sql"
+    schema_path.write_text("ALTER TABLE orders_table DROP COLUMN index;\n")
+    pipeline = StubPipeline(tmp_path / "checkpoints", schema_path)
+    for name in ["table_input_version", "extract_table", "load_table", "execute_schema_sql_file"]:
+        monkeypatch.setattr(main, name, getattr(pipeline, name))
+    monkeypatch.setattr(main, "postgres_connection_string", lambda creds_file: "postgresql://stub")
+    return pipeline
+
+
+def test_schema_reloads_the_tables_it_altered_when_a_table_is_uploaded_again(stub_pipeline):
+    stages = ["dim_users", "orders_table", "schema"]
+    main.run_pipeline(stub_pipeline.config, stages)
+    assert (stub_pipeline.loaded, stub_pipeline.schema_runs) == (["dim_users", "orders_table"], 1)
+
+    stub_pipeline.loaded.clear()
+    main.run_pipeline(stub_pipeline.config, stages, force=["dim_users"])
+
+    # orders_table is put back as uploaded from its checkpoint, without extracting it, before the script runs on both tables again
+    assert stub_pipeline.loaded == ["dim_users", "orders_table"]
+    assert stub_pipeline.extracted == ["legacy_users", "orders_table", "legacy_users"]
+    assert stub_pipeline.schema_runs == 2
+
+    stub_pipeline.loaded.clear()
+    main.run_pipeline(stub_pipeline.config, stages)
+
+    assert (stub_pipeline.loaded, stub_pipeline.schema_runs) == ([], 2)
+
+
+def test_schema_reload_needs_the_cleaned_data_checkpoint(stub_pipeline):
+    main.run_pipeline(stub_pipeline.config, ["dim_users", "orders_table", "schema"])
+    for parquet_path in glob.glob(os.path.join(stub_pipeline.config["checkpoint_dir"], "orders_table-*.parquet")):
+        os.remove(parquet_path)
+
+    with pytest.raises(RuntimeError, match="--force orders_table"):
+        main.run_pipeline(stub_pipeline.config, ["dim_users", "schema"], force=["dim_users"])
+
+    assert stub_pipeline.schema_runs == 1
+
+
+def test_table_stage_is_skipped_when_its_marker_matches(stub_pipeline):
+    assert main.run_table_stage("dim_users", stub_pipeline.config) == (3, False)
+
+    assert main.run_table_stage("dim_users", stub_pipeline.config) == (3, True)
+    assert (stub_pipeline.extracted, stub_pipeline.loaded) == (["legacy_users"], ["dim_users"])
+
+    # a new source version no longer matches the marker
+    stub_pipeline.source_versions["legacy_users"] = "v2"
+    assert main.run_table_stage("dim_users", stub_pipeline.config) == (3, False)
+    assert stub_pipeline.extracted == ["legacy_users", "legacy_users"]
+
+
+def test_table_stage_resumes_from_its_cleaned_data_after_a_failed_upload(stub_pipeline):
+    stub_pipeline.failing_loads.add("dim_users")
+    with pytest.raises(ConnectionError):
+        main.run_table_stage("dim_users", stub_pipeline.config)
+    assert main.read_completion_marker(stub_pipeline.config["checkpoint_dir"], "dim_users") is None
+
+    stub_pipeline.failing_loads.clear()
+    assert main.run_table_stage("dim_users", stub_pipeline.config) == (3, False)
+
+    # the second run uploaded the checkpoint instead of extracting the source again
+    assert (stub_pipeline.extracted, stub_pipeline.loaded) == (["legacy_users"], ["dim_users"])
+    assert main.read_completion_marker(stub_pipeline.config["checkpoint_dir"], "dim_users")["rows"] == 3
+
+
+def test_force_ignores_the_marker_and_the_cleaned_data(stub_pipeline):
+    main.run_table_stage("dim_users", stub_pipeline.config)
+    assert main.run_table_stage("dim_users", stub_pipeline.config, force=True) == (3, False)
+
+    # a new version whose upload fails leaves cleaned data behind, which force doesn't reuse either
+    stub_pipeline.source_versions["legacy_users"] = "v2"
+    stub_pipeline.failing_loads.add("dim_users")
+    with pytest.raises(ConnectionError):
+        main.run_table_stage("dim_users", stub_pipeline.config)
+    stub_pipeline.failing_loads.clear()
+    assert main.run_table_stage("dim_users", stub_pipeline.config, force=True) == (3, False)
+
+    assert stub_pipeline.extracted == ["legacy_users"] * 4
+    assert stub_pipeline.loaded == ["dim_users"] * 3
+
+
+def test_table_stage_removes_the_cleaned_data_of_older_input_versions(stub_pipeline):
+    checkpoint_dir = stub_pipeline.config["checkpoint_dir"]
+    main.run_table_stage("dim_users", stub_pipeline.config)
+    main.run_table_stage("orders_table", stub_pipeline.config)
+    first_checkpoints = glob.glob(os.path.join(checkpoint_dir, "dim_users-*.parquet"))
+
+    stub_pipeline.source_versions["legacy_users"] = "v2"
+    main.run_table_stage("dim_users", stub_pipeline.config)
+
+    checkpoints = glob.glob(os.path.join(checkpoint_dir, "dim_users-*.parquet"))
+    assert len(first_checkpoints) == len(checkpoints) == 1 and checkpoints != first_checkpoints
+    new_version = stub_pipeline.table_input_version(stub_pipeline.config["tables"]["dim_users"], None, None, None)
+    assert checkpoints == [main.clean_checkpoint_path(checkpoint_dir, "dim_users", new_version)]
+    # another stage's checkpoint is left alone
+    assert len(glob.glob(os.path.join(checkpoint_dir, "orders_table-*.parquet"))) == 1